@@ -5,7 +5,7 @@ from sqlalchemy import pool
 
 from alembic import context
 
-from app.models.database import Base, Project, Message, Fragment, Usage
+from app.models.database import Base, Project, Message, Fragment, Usage, WorkflowEvent, FileBlob, AgentRun, SandboxLease
 from app.core.database import engine
 
 
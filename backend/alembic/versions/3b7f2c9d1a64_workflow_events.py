@@ -0,0 +1,37 @@
+"""Workflow events
+
+Revision ID: 3b7f2c9d1a64
+Revises: 56d367e9cdf8
+Create Date: 2026-10-18 10:12:41.203318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b7f2c9d1a64'
+down_revision: Union[str, Sequence[str], None] = '56d367e9cdf8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('workflow_events',
+    sa.Column('run_id', sa.UUID(), nullable=False),
+    sa.Column('seq', sa.Integer(), nullable=False),
+    sa.Column('project_id', sa.UUID(), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('run_id', 'seq')
+    )
+    op.create_index(op.f('ix_workflow_events_project_id'), 'workflow_events', ['project_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_workflow_events_project_id'), table_name='workflow_events')
+    op.drop_table('workflow_events')
@@ -0,0 +1,30 @@
+"""Agent run idempotency key
+
+Revision ID: 4e7a0c95b2d1
+Revises: f3b86d2c4e19
+Create Date: 2026-10-18 14:12:30.684102
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4e7a0c95b2d1'
+down_revision: Union[str, Sequence[str], None] = 'f3b86d2c4e19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('agent_runs', sa.Column('idempotency_key', sa.String(), nullable=True))
+    op.create_index('uq_agent_runs_project_id_idempotency_key', 'agent_runs', ['project_id', 'idempotency_key'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_agent_runs_project_id_idempotency_key', table_name='agent_runs')
+    op.drop_column('agent_runs', 'idempotency_key')
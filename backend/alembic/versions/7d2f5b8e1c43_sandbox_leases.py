@@ -0,0 +1,45 @@
+"""Sandbox leases
+
+Revision ID: 7d2f5b8e1c43
+Revises: 4e7a0c95b2d1
+Create Date: 2026-10-18 18:41:07.529316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d2f5b8e1c43'
+down_revision: Union[str, Sequence[str], None] = '4e7a0c95b2d1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('sandbox_leases',
+    sa.Column('project_id', sa.UUID(), nullable=False),
+    sa.Column('sandbox_id', sa.String(), nullable=True),
+    sa.Column('owner', sa.String(), nullable=True),
+    sa.Column('lease_expires_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('run_id', sa.UUID(), nullable=True),
+    # The run_status type already exists; it was created with agent_runs.
+    sa.Column('run_status', postgresql.ENUM('QUEUED', 'RUNNING', 'SUCCEEDED', 'FAILED', name='run_status', create_type=False), nullable=True),
+    sa.Column('last_active_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('paused_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('project_id')
+    )
+    op.create_index(op.f('ix_sandbox_leases_sandbox_id'), 'sandbox_leases', ['sandbox_id'], unique=False)
+    op.create_index('ix_sandbox_leases_last_active_at', 'sandbox_leases', ['last_active_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_sandbox_leases_last_active_at', table_name='sandbox_leases')
+    op.drop_index(op.f('ix_sandbox_leases_sandbox_id'), table_name='sandbox_leases')
+    op.drop_table('sandbox_leases')
@@ -0,0 +1,28 @@
+"""Message keyset index
+
+Revision ID: 8c41e5a0f2d7
+Revises: 3b7f2c9d1a64
+Create Date: 2026-10-18 11:03:17.540112
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c41e5a0f2d7'
+down_revision: Union[str, Sequence[str], None] = '3b7f2c9d1a64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_messages_project_id_created_at_id', 'messages', ['project_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_messages_project_id_created_at_id', table_name='messages')
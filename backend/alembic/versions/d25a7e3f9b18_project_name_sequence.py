@@ -0,0 +1,30 @@
+"""Project name sequence
+
+Revision ID: d25a7e3f9b18
+Revises: 8c41e5a0f2d7
+Create Date: 2026-10-18 11:41:52.093617
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd25a7e3f9b18'
+down_revision: Union[str, Sequence[str], None] = '8c41e5a0f2d7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(sa.schema.CreateSequence(sa.Sequence('project_name_seq', start=0, minvalue=0)))
+    # Continue the numbering of the names handed out so far.
+    op.execute("SELECT setval('project_name_seq', (SELECT count(*) FROM projects), false)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(sa.schema.DropSequence(sa.Sequence('project_name_seq')))
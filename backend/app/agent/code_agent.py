@@ -1,15 +1,21 @@
 import json
 from typing import Optional
 from app.agent.prompts import PROMPT
-from app.services.sandbox_service import SandboxService, SandboxFile
+from app.core.config import settings
+from app.core.telemetry import traced_tool
+from app.services.blob_store import MANIFEST_KEY, blob_store, content_hash
+from app.services.llm_cache import llm_cache
+from app.services.sandbox_registry import sandbox_registry
+from app.services.sandbox_service import FileEdit, SandboxService, SandboxFile
 from google.adk.agents import Agent
 from google.adk.tools import ToolContext
 
 
-class CodeAgent:
+def _short_hash(content: str) -> str:
+    return content_hash(content)[:12]
+
 
-    def __init__(self, sandbox: SandboxService) -> None:
-        self.sandbox = sandbox
+class CodeAgent:
 
     def agent(self):
         return Agent(
@@ -17,32 +23,73 @@ class CodeAgent:
             model="gemini-2.5-pro",
             description="A nextjs coding assistant that helps create and manage code files in a sandboxed environment.",
             static_instruction=PROMPT,
-            tools=[self._run_terminal, self._create_or_update_files, self._read_files, self._check_for_errors],
+            tools=[self._run_terminal, self._create_or_update_files, self._edit_file, self._read_files, self._check_for_errors],
             output_key="summary",
+            before_model_callback=llm_cache.before_model if settings.LLM_CACHE_ENABLED else None,
+            after_model_callback=llm_cache.after_model if settings.LLM_CACHE_ENABLED else None,
         )
     
-    async def _run_terminal(self, command: str) -> str:
+    async def _remember_files(self, tool_context: ToolContext, files: dict[str, str]) -> None:
+        """Add written files to the session's manifest; only hashes go into session state."""
+        manifest = dict(tool_context.state.get(MANIFEST_KEY) or {})
+        manifest.update(await blob_store.put(files))
+        tool_context.state[MANIFEST_KEY] = manifest
+
+    def _sandbox(self, tool_context: ToolContext) -> SandboxService:
+        """Resolve the sandbox of the run this tool call belongs to."""
+        return sandbox_registry.get(tool_context.state["project_id"])
+
+    @traced_tool
+    async def _run_terminal(self, command: str, tool_context: ToolContext) -> str:
         """Execute a terminal command in the sandbox and return the output."""
-        return await self.sandbox.run_command(command)
+        return await self._sandbox(tool_context).run_command(command)
     
+    @traced_tool
     async def _create_or_update_files(self, files: list[SandboxFile], tool_context: ToolContext):
         """Create or update files in the sandbox."""
-        new_files = await self.sandbox.create_or_update_files(files)
-        if isinstance(new_files, list):
-            tool_context.state["files"] = {file.path: file.content for file in new_files}
-            return "Files created/updated successfully. files: " + ", ".join([file.path for file in new_files])
-        else:
-            return new_files
+        results = await self._sandbox(tool_context).create_or_update_files(files)
+        written = [result for result in results if result.error is None]
+        failed = [result for result in results if result.error is not None]
+        lines = []
+        if written:
+            await self._remember_files(tool_context, {file.path: file.content for file in written})
+            lines.append("Files created/updated successfully. files: " + ", ".join([f"{file.path} (hash {_short_hash(file.content)})" for file in written]))
+        if failed:
+            lines.append("Failed files:")
+            lines.extend([f"{file.path}: {file.error}" for file in failed])
+        return "\n".join(lines)
     
-    async def _read_files(self, paths: list[str]):
+    @traced_tool
+    async def _edit_file(self, path: str, edits: list[FileEdit], tool_context: ToolContext, base_hash: Optional[str] = None) -> str:
+        """Edit an existing file by replacing exact snippets, without resending the whole file.
+
+        Each edit's search text must occur exactly once in the current file. Pass base_hash (the hash
+        reported by _read_files or a previous write) to make sure the file has not changed since.
+        If any edit conflicts nothing is written: re-read the file, or rewrite it with _create_or_update_files.
+        """
+        result = await self._sandbox(tool_context).edit_file(path, edits, base_hash)
+        if result.error:
+            return f"Edit failed: {result.error}"
+        if result.conflicts:
+            return "Edit not applied, nothing was written:\n" + "\n".join(result.conflicts)
+        await self._remember_files(tool_context, {result.path: result.content})
+        return f"File edited successfully: {result.path} (hash {_short_hash(result.content)})"
+
+    @traced_tool
+    async def _read_files(self, paths: list[str], tool_context: ToolContext):
         """Read files from the sandbox and return their contents as JSON string."""
-        contents = await self.sandbox.read_files(paths)
+        contents = await self._sandbox(tool_context).read_files(paths)
         if isinstance(contents, str):
             return contents
-        return json.dumps([content.model_dump() if isinstance(content, SandboxFile) else content for content in contents])
+        files = [content.model_dump() if isinstance(content, SandboxFile) else content for content in contents]
+        return json.dumps([{**file, "hash": _short_hash(file["content"])} for file in files])
     
-    async def _check_for_errors(self) -> Optional[str]:
-        """Check for any errors in the app. Returns error message or None if no errors."""
-        return await self.sandbox.check_for_errors()
+    @traced_tool
+    async def _check_for_errors(self, tool_context: ToolContext) -> Optional[dict]:
+        """Check for any errors in the app. Returns a dict whose "diagnostics" list describes each error (file, line, column, message), or None if no errors."""
+        result = await self._sandbox(tool_context).check_for_errors()
+        if result.ok:
+            return None
+        return result.model_dump(exclude_none=True, exclude={"ok", "skipped"})
         
         
\ No newline at end of file
@@ -1,25 +1,66 @@
-from app.services.sandbox_service import SandboxService
+import re
+from typing import Optional
+
 from google.adk.agents import Agent
-from google.adk.agents.readonly_context import ReadonlyContext
-from google.adk.utils import instructions_utils
+from google.adk.agents.callback_context import CallbackContext
+from google.genai import types
 
 from app.agent.prompts import TITLE_PROMPT
+from app.core.config import settings
+from app.services.llm_cache import llm_cache
+
+MAX_TITLE_LENGTH = 60
+
+REQUEST_PREFIX = re.compile(
+    r"^(please\s+)?((can|could|would|will)\s+you\s+)?(please\s+)?"
+    r"((build|create|make|generate|write|design|implement|develop)\s+)?(me\s+)?((a|an|the)\s+)?",
+    re.IGNORECASE,
+)
+SMALL_WORDS = {"a", "an", "and", "as", "at", "by", "for", "in", "of", "on", "or", "the", "to", "with"}
+
+
+def heuristic_title(prompt: str) -> Optional[str]:
+    """Derive a title from the first sentence of the request, e.g. "build me a todo app" -> "Todo App"."""
+    sentence = re.split(r"[.!?\n]", prompt.strip(), maxsplit=1)[0]
+    words = REQUEST_PREFIX.sub("", sentence).split()
+    title_words = []
+    for index, word in enumerate(words):
+        if len(" ".join(title_words + [word])) > MAX_TITLE_LENGTH:
+            break
+        if word.lower() not in SMALL_WORDS or index == 0:
+            word = word[:1].upper() + word[1:]
+        title_words.append(word)
+    return " ".join(title_words).rstrip(",;:-") or None
 
 class TitleGenerator:
-    def __init__(self, sandbox: SandboxService) -> None:
-        self.sandbox = sandbox
+    """Names a project from the user's first request.
 
+    Runs alongside the code agent, so the title never adds a model call to
+    the end of a run. Once the session has a title it is kept; with
+    ``TITLE_HEURISTIC`` enabled the title is derived from the request
+    without calling the model at all.
+    """
 
-    async def _get_instruction(self, context: ReadonlyContext) -> str:
-        return await instructions_utils.inject_session_state(TITLE_PROMPT, context)
+    def _before_agent(self, callback_context: CallbackContext) -> Optional[types.Content]:
+        title = callback_context.state.get("title")
+        if not title and settings.TITLE_HEURISTIC and callback_context.user_content:
+            prompt = "".join(part.text or "" for part in callback_context.user_content.parts or [])
+            title = heuristic_title(prompt)
+            if title:
+                callback_context.state["title"] = title
+        if title:
+            # Returning content skips the model call for this turn.
+            return types.Content(role="model", parts=[types.Part(text=title)])
+        return None
 
     def agent(self):
         return Agent(
             name="title_generator",
             model="gemini-2.0-flash",
             description="A title generator for code fragments.",
-            instruction=self._get_instruction,
+            instruction=TITLE_PROMPT,
+            before_agent_callback=self._before_agent,
+            before_model_callback=llm_cache.before_model if settings.LLM_CACHE_ENABLED else None,
+            after_model_callback=llm_cache.after_model if settings.LLM_CACHE_ENABLED else None,
             output_key="title",
         )
-    
-    
\ No newline at end of file
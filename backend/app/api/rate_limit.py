@@ -0,0 +1,84 @@
+import ipaddress
+from typing import Callable
+
+from fastapi import HTTPException, Request
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.services.quota import QuotaPolicy, quota_engine
+
+
+_trusted_proxies = [ipaddress.ip_network(proxy, strict=False) for proxy in settings.RATE_LIMIT_TRUSTED_PROXIES]
+
+
+def _is_trusted_proxy(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in _trusted_proxies)
+
+
+def client_key(request: Request) -> str:
+    """The caller's address: behind trusted proxies, the last X-Forwarded-For hop they did not add."""
+    host = request.client.host if request.client else "unknown"
+    if not _is_trusted_proxy(host):
+        return host
+    for hop in reversed(request.headers.get("x-forwarded-for", "").split(",")):
+        hop = hop.strip()
+        if not hop:
+            continue
+        host = hop
+        if not _is_trusted_proxy(hop):
+            break
+    return host
+
+
+def rate_limit(policy: QuotaPolicy) -> Callable:
+    """Dependency charging one point of ``policy`` to the calling client; 429 when the budget is spent."""
+
+    async def dependency(request: Request) -> None:
+        if not settings.RATE_LIMIT_ENABLED:
+            return
+        result = quota_engine.consume(policy, client_key(request))
+        if not result.allowed:
+            raise HTTPException(status_code=429, detail="Rate limit exceeded", headers=result.headers())
+        # Picked up by RateLimitHeadersMiddleware, which also covers streaming responses.
+        request.state.rate_limit = result
+        request.state.rate_limit_charge = (policy, client_key(request))
+
+    return dependency
+
+
+def refund(request: Request) -> None:
+    """Give back the point ``rate_limit`` charged for this request."""
+    charge = getattr(request.state, "rate_limit_charge", None)
+    if charge is None:
+        return
+    result = quota_engine.refund(*charge)
+    if result is not None:
+        request.state.rate_limit = result
+
+
+class RateLimitHeadersMiddleware:
+    """Adds the RateLimit-* headers of the request's quota check to its response."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                result = scope.get("state", {}).get("rate_limit")
+                if result is not None:
+                    headers = MutableHeaders(scope=message)
+                    for name, value in result.headers().items():
+                        headers.setdefault(name, value)
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
@@ -1,16 +1,33 @@
 import uuid
-from fastapi import APIRouter, Depends, Query
+from typing import AsyncGenerator, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
 from pydantic import Field
 
-from app.schemas.project import ChatRequest, ProjectResponse
+from app.schemas.project import BulkProjectCreateRequest, ChatRequest, ProjectDetailsResponse, ProjectResponse, RunResponse, SandboxLeaseResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.core.database import get_db
+from app.api.rate_limit import rate_limit, refund
+from app.core.database import get_db, get_read_db
 from app.services.agent_service import AgentService
-from app.services.sandbox_service import SandboxService
+from app.services.quota import CHAT_QUOTA, FILES_QUOTA
+from app.services.sandbox_cache import sandbox_cache
+from app.services.sandbox_lifecycle import sandbox_lifecycle
+from app.services.sandbox_service import SandboxConnectionError, SandboxService
 
 router = APIRouter()
 
 
+async def get_sandbox(sandbox_id: str) -> AsyncGenerator[SandboxService, None]:
+    """
+    Dependency that borrows a cached sandbox connection for the request.
+    """
+    try:
+        async with sandbox_cache.lease(sandbox_id) as service:
+            sandbox_lifecycle.touch(service.sandbox)
+            yield service
+    except SandboxConnectionError:
+        raise HTTPException(status_code=404, detail="Sandbox not found")
+
+
 @router.get("/project/new", response_model=ProjectResponse, response_model_exclude_none=True, response_model_exclude_unset=True)
 async def create_agent_chat_project(
     db: AsyncSession = Depends(get_db)
@@ -21,51 +38,115 @@ async def create_agent_chat_project(
     service = AgentService(db)
     return await service.create_agent_project()
 
-@router.get("/project/{project_id}/details", response_model=ProjectResponse, response_model_exclude_none=True, response_model_exclude_unset=True)
+@router.post("/projects/bulk", response_model=list[ProjectResponse], response_model_exclude_none=True, response_model_exclude_unset=True)
+async def create_agent_projects(
+    request: BulkProjectCreateRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Create several projects at once.
+    """
+    service = AgentService(db)
+    return await service.create_agent_projects(request.count, request.names)
+
+@router.get("/project/{project_id}/details", response_model=ProjectDetailsResponse, response_model_exclude_none=True, response_model_exclude_unset=True)
 async def get_project_messages(
     project_id: uuid.UUID,
-    db: AsyncSession = Depends(get_db)
+    limit: Optional[int] = Query(None, ge=1, le=200, description="Number of messages per page; without limit and cursor, the full history is returned"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    include_fragments: bool = Query(False, description="Include the fragment generated with each message"),
+    db: AsyncSession = Depends(get_read_db)
     ):
     """
-    Create a new chat session for the specified agent.
+    Get a project with one page of its messages, newest first.
+    Without limit and cursor, all of its messages are returned oldest first, as before paging.
     """
     service = AgentService(db)
-    return await service.get_project_details(project_id)
+    return await service.get_project_details(project_id, limit, cursor, include_fragments)
 
-@router.post("/project/{project_id}/chat", response_model_exclude_none=True, response_model_exclude_unset=True)
+@router.post("/project/{project_id}/chat", dependencies=[Depends(rate_limit(CHAT_QUOTA))], response_model_exclude_none=True, response_model_exclude_unset=True)
 async def create_project_messages(
     project_id: uuid.UUID,
     message: ChatRequest,
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     db: AsyncSession = Depends(get_db),
 ):
     """
     Create a new chat session for the specified agent.
+    Attaching to a run that already handles the message is not charged to the rate limit.
     """
     service = AgentService(db)
-    return await service.execute_chat(project_id, message)
+    return await service.execute_chat(project_id, message, idempotency_key, on_duplicate=lambda: refund(request))
 
+@router.post("/project/{project_id}/runs", dependencies=[Depends(rate_limit(CHAT_QUOTA))], response_model=RunResponse, status_code=202, response_model_exclude_none=True, response_model_exclude_unset=True)
+async def submit_project_run(
+    project_id: uuid.UUID,
+    message: ChatRequest,
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Queue a run for the message; follow it through the run's events endpoint.
+    Retries with the same Idempotency-Key, or the same message while it is still in flight, return the existing run
+    and are not charged to the rate limit.
+    """
+    service = AgentService(db)
+    return await service.submit_run(project_id, message, idempotency_key, on_duplicate=lambda: refund(request))
 
-@router.get("/sandbox/{sandbox_id}/list_files", response_model_exclude_none=True, response_model_exclude_unset=True)
-async def list_files(
-    sandbox_id: str,
+@router.get("/project/{project_id}/runs/{run_id}", response_model=RunResponse, response_model_exclude_none=True, response_model_exclude_unset=True)
+async def get_project_run(
+    project_id: uuid.UUID,
+    run_id: uuid.UUID,
     db: AsyncSession = Depends(get_db),
+):
+    """
+    Get the status of a run.
+    """
+    service = AgentService(db)
+    return await service.get_run(project_id, run_id)
+
+@router.get("/project/{project_id}/sandbox", response_model=SandboxLeaseResponse, response_model_exclude_none=True, response_model_exclude_unset=True)
+async def get_project_sandbox(
+    project_id: uuid.UUID,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Get the project's sandbox, whether a run is executing and the status of its latest run.
+    """
+    service = AgentService(db)
+    return await service.get_sandbox_lease(project_id)
+
+@router.get("/project/{project_id}/runs/{run_id}/events", response_model_exclude_none=True, response_model_exclude_unset=True)
+async def resume_project_run(
+    project_id: uuid.UUID,
+    run_id: uuid.UUID,
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Replay a run's events after Last-Event-ID, then follow the run until it completes.
+    """
+    service = AgentService(db)
+    return await service.stream_run(project_id, run_id, last_event_id)
+
+
+@router.get("/sandbox/{sandbox_id}/list_files", dependencies=[Depends(rate_limit(FILES_QUOTA))], response_model_exclude_none=True, response_model_exclude_unset=True)
+async def list_files(
+    service: SandboxService = Depends(get_sandbox),
 ):
     """
     List all files in the sandbox.
     """
-    service = SandboxService()
-    await service.connect(sandbox_id)
     return await service.list_files()
 
-@router.get("/sandbox/{sandbox_id}/{path:path}", response_model_exclude_none=True, response_model_exclude_unset=True)
+@router.get("/sandbox/{sandbox_id}/{path:path}", dependencies=[Depends(rate_limit(FILES_QUOTA))], response_model_exclude_none=True, response_model_exclude_unset=True)
 async def read_file(
-    sandbox_id: str,
     path: str,
-    db: AsyncSession = Depends(get_db),
+    service: SandboxService = Depends(get_sandbox),
 ):
     """
     Read a file from the sandbox.
     """
-    service = SandboxService()
-    await service.connect(sandbox_id)
     return await service.read_file(path)
@@ -1,6 +1,6 @@
 
 from typing import AsyncGenerator, Optional
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from app.core.config import settings
 
 # PostgreSQL Database Engine
@@ -12,12 +12,39 @@ from app.core.config import settings
 #     pool_recycle=300,
 # )
 
-engine = create_async_engine(
-    str(settings.DATABASE_URL),
-    echo=False,
-    future=True,
-    pool_pre_ping=True,
-    pool_recycle=300,
+def create_engine(
+    url: str,
+    pool_size: int = settings.DB_POOL_SIZE,
+    max_overflow: int = settings.DB_MAX_OVERFLOW,
+) -> AsyncEngine:
+    """Create an engine with the pool and statement cache settings from Settings."""
+    connect_args = {}
+    if not settings.DB_PREPARED_STATEMENTS and url.startswith("postgresql+psycopg"):
+        # Server-side prepared statements don't survive PgBouncer in transaction mode.
+        connect_args["prepare_threshold"] = None
+    return create_async_engine(
+        str(url),
+        echo=False,
+        future=True,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        query_cache_size=settings.DB_STATEMENT_CACHE_SIZE,
+        connect_args=connect_args,
+    )
+
+engine = create_engine(settings.DATABASE_URL)
+
+# Read-only paths go to the replica when one is configured, to the primary otherwise.
+read_engine = create_engine(settings.DATABASE_READ_URL) if settings.DATABASE_READ_URL else engine
+
+# Postgres advisory locks live on connections of their own, so held run locks never starve queries.
+lock_engine = (
+    create_engine(settings.DATABASE_URL, settings.DB_LOCK_POOL_SIZE, settings.DB_LOCK_MAX_OVERFLOW)
+    if engine.dialect.name == "postgresql"
+    else engine
 )
 
 # Session factory
@@ -29,6 +56,15 @@ AsyncSessionLocal = async_sessionmaker(
     autocommit=False,
 )
 
+# Session factory for reads that tolerate replication lag
+AsyncReadSessionLocal = async_sessionmaker(
+    read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+    autoflush=False,
+    autocommit=False,
+)
+
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     """
     Dependency function that yields database sessions.
@@ -44,3 +80,20 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
             raise
         finally:
             await session.close()
+
+async def get_read_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependency function that yields read-only database sessions, served by
+    the read replica when ``DATABASE_READ_URL`` is set.
+
+    Yields:
+        AsyncSession: Database session
+    """
+    async with AsyncReadSessionLocal() as session:
+        try:
+            yield session
+        except Exception:
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
@@ -0,0 +1,49 @@
+
+from typing import TYPE_CHECKING, Optional
+from app.core.config import settings
+
+if TYPE_CHECKING:
+    from google.adk.sessions import DatabaseSessionService
+
+# ADK session service, shared by every workflow in the process
+_session_service: Optional["DatabaseSessionService"] = None
+
+def init_session_service() -> "DatabaseSessionService":
+    """
+    Create the process-wide ADK session service and its connection pool.
+
+    Returns:
+        DatabaseSessionService: The shared session service
+    """
+    global _session_service
+    if _session_service is None:
+        # Imported here: google.adk is only needed by processes that execute runs.
+        from google.adk.sessions import DatabaseSessionService
+
+        _session_service = DatabaseSessionService(
+            db_url=settings.DATABASE_URL,
+            pool_size=settings.ADK_DB_POOL_SIZE,
+            max_overflow=settings.ADK_DB_MAX_OVERFLOW,
+            pool_timeout=settings.ADK_DB_POOL_TIMEOUT,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+            pool_recycle=300,
+        )
+    return _session_service
+
+def get_session_service() -> "DatabaseSessionService":
+    """
+    Return the shared session service, creating it on first use.
+
+    Returns:
+        DatabaseSessionService: The shared session service
+    """
+    return _session_service or init_session_service()
+
+async def close_session_service() -> None:
+    """
+    Dispose of the session service's connection pool.
+    """
+    global _session_service
+    if _session_service is not None:
+        await _session_service.close()
+        _session_service = None
@@ -0,0 +1,188 @@
+import asyncio
+import contextvars
+import functools
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional
+
+from opentelemetry import context as otel_context
+from opentelemetry import trace
+from opentelemetry.trace import Span, Status, StatusCode
+from prometheus_client import Counter, Gauge, Histogram
+
+# Spans are no-ops until a tracer provider is configured; ADK's own spans nest under ours.
+tracer = trace.get_tracer("agentx")
+
+# Project ids go on spans only: as metric labels they would create a series per project.
+RUNS_IN_FLIGHT = Gauge("agentx_runs_in_flight", "Workflow runs currently executing.")
+RUN_DURATION = Histogram(
+    "agentx_run_duration_seconds", "Wall time of workflow runs.", ["outcome"],
+    buckets=(1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200),
+)
+PHASE_DURATION = Histogram(
+    "agentx_workflow_phase_duration_seconds", "Wall time of workflow phases.", ["phase"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
+TOOL_CALLS = Counter("agentx_tool_calls_total", "Agent tool calls.", ["tool", "outcome"])
+TOOL_DURATION = Histogram(
+    "agentx_tool_duration_seconds", "Wall time of agent tool calls.", ["tool"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+TOOLS_IN_FLIGHT = Gauge("agentx_tool_calls_in_flight", "Agent tool calls currently executing.", ["tool"])
+SANDBOX_CALLS = Counter("agentx_sandbox_calls_total", "Sandbox operations.", ["operation", "outcome"])
+SANDBOX_DURATION = Histogram(
+    "agentx_sandbox_call_duration_seconds", "Wall time of sandbox operations.", ["operation"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+SANDBOX_IN_FLIGHT = Gauge("agentx_sandbox_calls_in_flight", "Sandbox operations currently executing.", ["operation"])
+LLM_CACHE_REQUESTS = Counter("agentx_llm_cache_requests_total", "Model calls looked up in the response cache.", ["result"])
+
+_current_run: contextvars.ContextVar[Optional["RunTelemetry"]] = contextvars.ContextVar("current_run", default=None)
+
+
+def _outcome(exc_type: Optional[type]) -> str:
+    if exc_type is None:
+        return "ok"
+    if issubclass(exc_type, (asyncio.CancelledError, GeneratorExit)):
+        return "cancelled"
+    return "error"
+
+
+class RunTelemetry:
+    """Span, metrics and timing summary of one workflow run.
+
+    Use as a context manager around the run. The run span is never made
+    current in the caller, because workflows are generators that yield
+    between phases; phases and the agent task get it as their parent instead.
+    """
+
+    def __init__(self, project_id: uuid.UUID) -> None:
+        self.project_id = str(project_id)
+        self.span: Optional[Span] = None
+        self.started = 0.0
+        self.phases: dict[str, float] = {}
+        self.tools: dict[str, dict[str, float]] = {}
+        self.sandbox: dict[str, dict[str, float]] = {}
+
+    def __enter__(self) -> "RunTelemetry":
+        self.started = time.perf_counter()
+        self.span = tracer.start_span("workflow.run", attributes={"project.id": self.project_id})
+        RUNS_IN_FLIGHT.inc()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        outcome = _outcome(exc_type)
+        RUNS_IN_FLIGHT.dec()
+        RUN_DURATION.labels(outcome).observe(time.perf_counter() - self.started)
+        if outcome == "error":
+            self.span.record_exception(exc)
+            self.span.set_status(Status(StatusCode.ERROR))
+        self.span.set_attribute("outcome", outcome)
+        self.span.end()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[Span]:
+        """Time a phase of the run. The block must not yield out of a generator."""
+        started = time.perf_counter()
+        parent = trace.set_span_in_context(self.span)
+        with tracer.start_as_current_span(f"workflow.{name}", context=parent, attributes={"project.id": self.project_id}) as span:
+            try:
+                yield span
+            finally:
+                self._add_phase(name, time.perf_counter() - started)
+
+    def record_phase(self, name: str, started: float) -> None:
+        """Record a phase that began at ``started`` (a perf_counter value) and ends now."""
+        elapsed = time.perf_counter() - started
+        span = tracer.start_span(
+            f"workflow.{name}",
+            context=trace.set_span_in_context(self.span),
+            attributes={"project.id": self.project_id},
+            start_time=time.time_ns() - int(elapsed * 1e9),
+        )
+        span.end()
+        self._add_phase(name, elapsed)
+
+    def context(self) -> contextvars.Context:
+        """Context for a task working on this run, e.g. the agent: tool and sandbox calls made there are attributed to the run."""
+        ctx = contextvars.copy_context()
+        ctx.run(self._attach)
+        return ctx
+
+    def summary(self) -> dict[str, Any]:
+        """Timings so far, in milliseconds."""
+        return {
+            "total_ms": _ms(time.perf_counter() - self.started),
+            "phases_ms": {name: _ms(seconds) for name, seconds in self.phases.items()},
+            "tools": {name: {"calls": int(stats["calls"]), "ms": _ms(stats["seconds"])} for name, stats in self.tools.items()},
+            "sandbox": {name: {"calls": int(stats["calls"]), "ms": _ms(stats["seconds"])} for name, stats in self.sandbox.items()},
+        }
+
+    def _attach(self) -> None:
+        _current_run.set(self)
+        otel_context.attach(trace.set_span_in_context(self.span))
+
+    def _add_phase(self, name: str, seconds: float) -> None:
+        PHASE_DURATION.labels(name).observe(seconds)
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 1)
+
+
+@contextmanager
+def _observe(
+    kind: str,
+    name: str,
+    calls: Counter,
+    duration: Histogram,
+    in_flight: Gauge,
+    totals: Callable[["RunTelemetry"], dict[str, dict[str, float]]],
+) -> Iterator[None]:
+    run = _current_run.get()
+    attributes = {f"{kind}.name": name}
+    if run:
+        attributes["project.id"] = run.project_id
+    started = time.perf_counter()
+    gauge = in_flight.labels(name)
+    gauge.inc()
+    exc_type = None
+    try:
+        with tracer.start_as_current_span(f"{kind}.{name}", attributes=attributes):
+            yield
+    except BaseException as e:
+        exc_type = type(e)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        gauge.dec()
+        calls.labels(name, _outcome(exc_type)).inc()
+        duration.labels(name).observe(elapsed)
+        if run:
+            stats = totals(run).setdefault(name, {"calls": 0, "seconds": 0.0})
+            stats["calls"] += 1
+            stats["seconds"] += elapsed
+
+
+def traced_tool(func: Callable) -> Callable:
+    """Time every call of an agent tool, named as the model sees it."""
+    name = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        with _observe("tool", name, TOOL_CALLS, TOOL_DURATION, TOOLS_IN_FLIGHT, lambda run: run.tools):
+            return await func(*args, **kwargs)
+    return wrapper
+
+
+def traced_sandbox_call(func: Callable) -> Callable:
+    """Time every call of a sandbox operation, named after the method."""
+    name = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        with _observe("sandbox", name, SANDBOX_CALLS, SANDBOX_DURATION, SANDBOX_IN_FLIGHT, lambda run: run.sandbox):
+            return await func(*args, **kwargs)
+    return wrapper
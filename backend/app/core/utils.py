@@ -0,0 +1,6 @@
+from datetime import datetime, timezone
+
+
+def utcnow() -> datetime:
+    """Timezone-aware current time in UTC, as stored in the database."""
+    return datetime.now(timezone.utc)
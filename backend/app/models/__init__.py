@@ -1,5 +1,5 @@
 """Database models package."""
-from .database import Project, Message, Fragment, Usage, MessageRole, MessageType
+from .database import Project, Message, Fragment, Usage, MessageRole, MessageType, WorkflowEvent, FileBlob, AgentRun, RunStatus, SandboxLease
 
 __all__ = [
     "Project",
@@ -8,4 +8,9 @@ __all__ = [
     "Usage",
     "MessageRole",
     "MessageType",
+    "WorkflowEvent",
+    "FileBlob",
+    "AgentRun",
+    "RunStatus",
+    "SandboxLease",
 ]
@@ -2,7 +2,7 @@ from typing import List
 import enum
 import uuid
 from datetime import datetime
-from sqlalchemy import JSON, Enum, ForeignKey, Integer, String, DateTime
+from sqlalchemy import JSON, Enum, ForeignKey, Index, Integer, LargeBinary, Sequence, String, DateTime, Text
 from sqlalchemy.orm import Mapped, mapped_column, relationship, DeclarativeBase
 from sqlalchemy.dialects.postgresql import  UUID
 from sqlalchemy.sql import func
@@ -11,6 +11,9 @@ class Base(DeclarativeBase):
     """Base class for all SQLAlchemy models."""
     pass
 
+# Numbers the default "New Project N" names
+project_name_seq = Sequence("project_name_seq", start=0, minvalue=0, metadata=Base.metadata)
+
 class MessageRole(str, enum.Enum):
     """Message role enumeration."""
 
@@ -23,6 +26,14 @@ class MessageType(str, enum.Enum):
     RESULT = "RESULT"
     ERROR = "ERROR"
 
+class RunStatus(str, enum.Enum):
+    """Agent run status enumeration."""
+
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    SUCCEEDED = "SUCCEEDED"
+    FAILED = "FAILED"
+
 class Project(Base):
     "Project Model."
     __tablename__ = "projects"
@@ -43,6 +54,10 @@ class Project(Base):
 class Message(Base):
     "Message Model."
     __tablename__ = "messages"
+    __table_args__ = (
+        # Keyset pagination of a project's history
+        Index("ix_messages_project_id_created_at_id", "project_id", "created_at", "id"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), 
@@ -112,4 +127,79 @@ class Usage(Base):
     
     key: Mapped[str] = mapped_column(String, primary_key=True)
     points: Mapped[int] = mapped_column(Integer, nullable=False)
-    expire: Mapped[str] = mapped_column(String, nullable=True)
\ No newline at end of file
+    expire: Mapped[str] = mapped_column(String, nullable=True)
+
+class WorkflowEvent(Base):
+    """Event emitted by a workflow run, kept so clients can resume the stream."""
+    __tablename__ = "workflow_events"
+
+    run_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True)
+    seq: Mapped[int] = mapped_column(Integer, primary_key=True)
+    project_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), nullable=False, index=True)
+    payload: Mapped[str] = mapped_column(Text, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=func.now(), nullable=False)
+
+class FileBlob(Base):
+    """Compressed file content, stored once per distinct content and addressed by its SHA-256."""
+    __tablename__ = "file_blobs"
+
+    hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+    data: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=func.now(), nullable=False)
+
+class AgentRun(Base):
+    """A chat message waiting for, or being handled by, an agent worker."""
+    __tablename__ = "agent_runs"
+    __table_args__ = (
+        # Claiming scans queued runs oldest first
+        Index("ix_agent_runs_status_created_at", "status", "created_at"),
+        Index("uq_agent_runs_project_id_idempotency_key", "project_id", "idempotency_key", unique=True),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    project_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True),
+        ForeignKey("projects.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True
+    )
+    message: Mapped[str] = mapped_column(Text, nullable=False)
+    idempotency_key: Mapped[str] = mapped_column(String, nullable=True)
+    status: Mapped[RunStatus] = mapped_column(
+        Enum(RunStatus, name="run_status"),
+        nullable=False,
+        default=RunStatus.QUEUED
+    )
+    worker_id: Mapped[str] = mapped_column(String, nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=func.now(), nullable=False)
+    started_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
+    heartbeat_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
+
+class SandboxLease(Base):
+    """Which worker holds a project's sandbox and run, shared by every worker on the database."""
+    __tablename__ = "sandbox_leases"
+    __table_args__ = (
+        # The lifecycle sweep looks for unowned sandboxes idle the longest
+        Index("ix_sandbox_leases_last_active_at", "last_active_at"),
+    )
+
+    project_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True),
+        ForeignKey("projects.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+    sandbox_id: Mapped[str] = mapped_column(String, nullable=True, index=True)
+    owner: Mapped[str] = mapped_column(String, nullable=True)
+    lease_expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
+    run_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), nullable=True)
+    run_status: Mapped[RunStatus] = mapped_column(Enum(RunStatus, name="run_status"), nullable=True)
+    last_active_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=func.now(), nullable=False)
+    paused_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    @property
+    def running(self) -> bool:
+        """Whether a worker holds the lease, i.e. a run of the project is executing."""
+        return self.owner is not None
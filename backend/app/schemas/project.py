@@ -4,6 +4,8 @@ import uuid
 
 from pydantic import BaseModel, Field
 
+from app.models.database import MessageRole, MessageType
+
 class ProjectResponse(BaseModel):
     """Response schema for an agent session."""
     id: uuid.UUID = Field(..., description="ID of the session", examples=[str(uuid.uuid4())])
@@ -14,6 +16,65 @@ class ProjectResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class FragmentResponse(BaseModel):
+    """Response schema for a generated code fragment."""
+    id: uuid.UUID = Field(..., description="ID of the fragment", examples=[str(uuid.uuid4())])
+    title: str = Field(..., description="Title of the fragment", examples=["React Todo App with Local Storage"])
+    sandbox_url: str = Field(..., description="Preview URL of the sandbox", examples=["https://3000-sandbox.e2b.app"])
+    files: Dict[str, Any] = Field(..., description="Generated files keyed by path")
+    created_at: datetime = Field(..., description="Timestamp when the fragment was created", examples=["2024-06-01T12:00:00Z"])
+
+    class Config:
+        from_attributes = True
+
+class MessageResponse(BaseModel):
+    """Response schema for a project message."""
+    id: uuid.UUID = Field(..., description="ID of the message", examples=[str(uuid.uuid4())])
+    content: str = Field(..., description="Content of the message", examples=["Build a todo app"])
+    role: MessageRole = Field(..., description="Role of the message", examples=["USER", "ASSISTANT"])
+    type: MessageType = Field(..., description="Type of the message", examples=["RESULT", "ERROR"])
+    created_at: datetime = Field(..., description="Timestamp when the message was created", examples=["2024-06-01T12:00:00Z"])
+    fragment: Optional[FragmentResponse] = Field(None, description="Fragment generated with the message, when requested")
+
+    class Config:
+        from_attributes = True
+
+class ProjectDetailsResponse(ProjectResponse):
+    """Response schema for a project with its messages: one page, newest first, or the full history, oldest first."""
+    messages: List[MessageResponse] = Field(default_factory=list, description="Messages of the page, newest first; without paging, all messages, oldest first")
+    next_cursor: Optional[str] = Field(None, description="Cursor for the next (older) page, if there is one")
+
+class BulkProjectCreateRequest(BaseModel):
+    """Request schema for creating several projects at once."""
+    count: int = Field(1, ge=1, le=1000, description="Number of projects to create when no names are given", examples=[10])
+    names: Optional[List[str]] = Field(None, min_length=1, max_length=1000, description="Explicit project names; one project per name", examples=[["Onboarding 1", "Onboarding 2"]])
+
+class RunResponse(BaseModel):
+    """Response schema for a queued agent run."""
+    id: uuid.UUID = Field(..., description="ID of the run", examples=[str(uuid.uuid4())])
+    project_id: uuid.UUID = Field(..., description="ID of the project", examples=[str(uuid.uuid4())])
+    status: str = Field(..., description="Status of the run", examples=["QUEUED", "RUNNING", "SUCCEEDED", "FAILED"])
+    attempts: int = Field(..., description="How many times a worker has started the run", examples=[1])
+    created_at: datetime = Field(..., description="Timestamp when the run was submitted", examples=["2024-06-01T12:00:00Z"])
+    started_at: Optional[datetime] = Field(None, description="Timestamp when a worker last started the run", examples=["2024-06-01T12:00:01Z"])
+    finished_at: Optional[datetime] = Field(None, description="Timestamp when the run finished", examples=["2024-06-01T12:03:00Z"])
+
+    class Config:
+        from_attributes = True
+
+class SandboxLeaseResponse(BaseModel):
+    """Response schema for the project's entry in the sandbox lease registry."""
+    project_id: uuid.UUID = Field(..., description="ID of the project", examples=[str(uuid.uuid4())])
+    sandbox_id: Optional[str] = Field(None, description="ID of the project's sandbox", examples=["i1a2b3c4d5e6f7g8h9"])
+    running: bool = Field(..., description="Whether a run of the project is executing", examples=[True])
+    run_id: Optional[uuid.UUID] = Field(None, description="ID of the project's latest run", examples=[str(uuid.uuid4())])
+    run_status: Optional[str] = Field(None, description="Status of the project's latest run", examples=["RUNNING"])
+    last_active_at: datetime = Field(..., description="Timestamp of the last recorded sandbox activity", examples=["2024-06-01T12:00:30Z"])
+    paused_at: Optional[datetime] = Field(None, description="Timestamp when the idle sandbox was paused", examples=["2024-06-01T12:10:30Z"])
+
+    class Config:
+        from_attributes = True
+
 class ChatRequest(BaseModel):
     message: str = Field(..., description="Message to add to the project", examples=["Hello, how can I help you?"])
 
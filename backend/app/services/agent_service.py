@@ -1,14 +1,65 @@
 
 
+import base64
+import re
 import uuid
+from datetime import datetime
+from typing import Callable, Optional
 from fastapi import HTTPException
 from fastapi.responses import StreamingResponse
-from sqlalchemy import func, select
+from sqlalchemy import String, and_, cast, func, insert, literal, select, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models.database import MessageType, Project, Message, MessageRole
+from app.models.database import Fragment, Project, Message, project_name_seq
 from app.schemas.project import ChatRequest
-from app.services.workflow_service import WorkflowService
+from app.services.blob_store import blob_store
+from app.services.event_log import event_log_store, stream_run_events
+from app.services.run_manager import run_manager
+from app.services.sandbox_leases import sandbox_leases
+
+DEFAULT_NAME_PREFIX = "New Project "
+_DEFAULT_NAME = re.compile(re.escape(DEFAULT_NAME_PREFIX) + r"\d+")
+
+
+def is_default_project_name(name: Optional[str]) -> bool:
+    """Whether the project still has the name it was created with, i.e. the user hasn't named it."""
+    return not name or _DEFAULT_NAME.fullmatch(name) is not None
+
+
+def default_project_name(dialect_name: str, offset: int = 0):
+    """SQL expression for 'New Project N' with N taken from the project name sequence.
+
+    SQLite, used by the tests and benchmarks only, has no sequences and
+    numbers by row count instead. The count is the same for every row of
+    one INSERT, so the ``offset`` of the row within it is added. SQLite has
+    a single writer and takes its write lock before the count is read, so
+    concurrent creates are serialized and their names stay distinct. Other
+    databases without sequences are not supported.
+    """
+    if dialect_name == "postgresql":
+        number = project_name_seq.next_value()
+    else:
+        number = select(func.count(Project.id)).scalar_subquery() + offset
+    return literal(DEFAULT_NAME_PREFIX) + cast(number, String)
+
+
+DEFAULT_PAGE_SIZE = 50
+
+
+def encode_cursor(created_at: datetime, message_id: uuid.UUID) -> str:
+    """Opaque cursor pointing just past the given message."""
+    raw = f"{created_at.isoformat()}|{message_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, message_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), uuid.UUID(message_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 
 class AgentService():
 
@@ -17,64 +68,167 @@ class AgentService():
 
     async def create_agent_project(self):
         """Create a new project."""
-        count = await self.db.execute(select(func.count(Project.id)))
-        obj_data = {"name": f"New Project {count.scalar()}"}
-        db_obj = Project(**obj_data)
-        self.db.add(db_obj)
-        await self.db.flush()
-        await self.db.refresh(db_obj)
+        projects = await self.create_agent_projects(1)
+        return projects[0]
+
+    async def create_agent_projects(self, count: int = 1, names: Optional[list[str]] = None):
+        """Create projects in a single INSERT ... RETURNING.
+
+        Unnamed projects are numbered from the ``project_name_seq`` sequence,
+        so naming neither scans the projects table nor races with concurrent
+        creations.
+        """
+        if names:
+            rows = [{"name": name} for name in names]
+        else:
+            dialect_name = self.db.get_bind().dialect.name
+            rows = [{"name": default_project_name(dialect_name, offset)} for offset in range(count)]
+        result = await self.db.execute(insert(Project).values(rows).returning(Project))
+        projects = result.scalars().all()
         await self.db.commit()
-        return db_obj
+        return projects
 
-    async def get_project_details(self, project_id: uuid.UUID):
-        """Get all messages for a project."""
-        # First check if project exists
-        stmt = select(Project).where(Project.id == project_id)
+    async def get_project_details(
+        self,
+        project_id: uuid.UUID,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        include_fragments: bool = False,
+    ):
+        """Get a project with one page of its messages, newest first.
+
+        The project and the page come back in a single query: messages are
+        outer-joined onto the project, so a project without (more) messages
+        still yields one row. Pages are keyed on (created_at, id), which the
+        ``ix_messages_project_id_created_at_id`` index serves directly.
+        Without ``limit`` and ``cursor`` the whole history is returned, oldest
+        first, for clients that predate paging.
+        """
+        paged = limit is not None or cursor is not None
+        limit = limit or DEFAULT_PAGE_SIZE
+        page_filter = Message.project_id == Project.id
+        if cursor:
+            created_at, message_id = decode_cursor(cursor)
+            page_filter = and_(page_filter, tuple_(Message.created_at, Message.id) < tuple_(created_at, message_id))
+
+        stmt = (
+            select(Project, Message)
+            .outerjoin(Message, page_filter)
+            .where(Project.id == project_id)
+        )
+        if paged:
+            stmt = stmt.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit + 1)
+        else:
+            stmt = stmt.order_by(Message.created_at, Message.id)
+        if include_fragments:
+            stmt = stmt.outerjoin(Fragment, Fragment.message_id == Message.id).add_columns(Fragment)
         result = await self.db.execute(stmt)
-        project = result.scalar_one_or_none()
-        
-        if project is None:
+        rows = result.all()
+
+        if not rows:
             raise HTTPException(status_code=404, detail="Project not found")
-        
-        # Fetch messages from Message table where project_id matches
-        messages_stmt = select(Message).where(Message.project_id == project_id)
-        messages_result = await self.db.execute(messages_stmt)
-        messages = messages_result.scalars().all()
+
+        project = rows[0][0]
+        rows = [row for row in rows if row[1] is not None]
+        next_cursor = None
+        if paged and len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1][1]
+            next_cursor = encode_cursor(last.created_at, last.id)
+
+        manifests = [row[2].files for row in rows if include_fragments and row[2] is not None]
+        contents = await blob_store.get_many({digest for manifest in manifests for digest in manifest.values()}, self.db)
+
+        messages = []
+        for row in rows:
+            message = row[1]
+            item = {
+                "id": message.id,
+                "content": message.content,
+                "role": message.role,
+                "type": message.type,
+                "created_at": message.created_at,
+            }
+            if include_fragments and row[2] is not None:
+                fragment = row[2]
+                # Fragments store {path: hash}; hand out the file contents.
+                item["fragment"] = {
+                    "id": fragment.id,
+                    "title": fragment.title,
+                    "sandbox_url": fragment.sandbox_url,
+                    "files": {path: contents[digest] for path, digest in fragment.files.items() if digest in contents},
+                    "created_at": fragment.created_at,
+                }
+            messages.append(item)
+
         details = {
             "id": project.id,
             "name": project.name,
             "created_at": project.created_at,
             "updated_at": project.updated_at,
-            "messages": messages
+            "messages": messages,
+            "next_cursor": next_cursor,
         }
         return details
     
-    async def _add_message(self, project_id: uuid.UUID, content: str, role: MessageRole, type: MessageType):
-        """Add a new message to a project."""
-        obj_data = {"content": content, "project_id": project_id, "role": role, "type": type}
-        db_obj = Message(**obj_data)
-        self.db.add(db_obj)
-        await self.db.flush()
-        await self.db.refresh(db_obj)
-        await self.db.commit()
-        return db_obj
+    async def execute_chat(
+        self,
+        project_id: uuid.UUID,
+        chat_request: ChatRequest,
+        idempotency_key: Optional[str] = None,
+        on_duplicate: Optional[Callable[[], None]] = None,
+    ):
+        """Queue a run for the message, or attach to the run already handling it, and stream its events."""
+        run = await self.submit_run(project_id, chat_request, idempotency_key, on_duplicate)
+        return self._event_stream(run.id)
 
-    async def execute_chat(self, project_id: uuid.UUID, chat_request: ChatRequest):
-        """Create a new message for a project."""
+    async def submit_run(
+        self,
+        project_id: uuid.UUID,
+        chat_request: ChatRequest,
+        idempotency_key: Optional[str] = None,
+        on_duplicate: Optional[Callable[[], None]] = None,
+    ):
+        """Queue a run for the message; a worker picks it up.
+
+        Duplicate requests get the existing run, after calling ``on_duplicate``.
+        """
         # First check if project exists
-        stmt = select(Project).where(Project.id == project_id)
+        stmt = select(Project.id).where(Project.id == project_id)
         result = await self.db.execute(stmt)
-        project = result.scalar_one_or_none()
-        
-        if project is None:
+        if result.scalar_one_or_none() is None:
             raise HTTPException(status_code=404, detail="Project not found")
-        
+        run, created = await run_manager.submit(project_id, chat_request.message, idempotency_key)
+        if not created and on_duplicate:
+            on_duplicate()
+        return run
+
+    async def get_run(self, project_id: uuid.UUID, run_id: uuid.UUID):
+        run = await run_manager.get(run_id, project_id)
+        if run is None:
+            raise HTTPException(status_code=404, detail="Run not found")
+        return run
+
+    async def get_sandbox_lease(self, project_id: uuid.UUID):
+        lease = await sandbox_leases.get(project_id, self.db)
+        if lease is None:
+            raise HTTPException(status_code=404, detail="Project has no sandbox yet")
+        return lease
+
+    async def stream_run(self, project_id: uuid.UUID, run_id: uuid.UUID, last_event_id: Optional[str] = None):
+        """Resume the event stream of a run after the given Last-Event-ID."""
+        if not await event_log_store.has_run(run_id, project_id):
+            raise HTTPException(status_code=404, detail="Run not found")
+        return self._event_stream(run_id, last_event_id)
+
+    def _event_stream(self, run_id: uuid.UUID, last_event_id: Optional[str] = None):
         return StreamingResponse(
-            WorkflowService(self.db).execute_workflow(project, chat_request.message),
+            stream_run_events(event_log_store, run_id, last_event_id),
             media_type="text/event-stream",
             headers={
                 "Cache-Control": "no-cache",
                 "X-Accel-Buffering": "no",
-                "Connection": "keep-alive"
+                "Connection": "keep-alive",
+                "X-Run-Id": str(run_id),
             }
         )
\ No newline at end of file
@@ -0,0 +1,103 @@
+import hashlib
+import re
+import zlib
+from typing import Any, Iterable, Mapping, Optional
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.database import FileBlob
+from app.services.file_cache import ByteLRU
+
+# Session state key of the {path: hash} manifest of the files the agent wrote.
+MANIFEST_KEY = "file_manifest"
+_HASH = re.compile(r"[0-9a-f]{64}")
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+class BlobStore:
+    """Content-addressed store for generated files.
+
+    Each distinct content is stored once, zlib-compressed, under its SHA-256.
+    Session state and fragments keep only ``{path: hash}`` manifests, and
+    contents are materialized when someone actually needs them. Recently
+    used contents are kept in memory, so materializing right after a write
+    does not go back to the database.
+    """
+
+    def __init__(self, cache_max_bytes: int = settings.BLOB_CACHE_MAX_BYTES) -> None:
+        self._cache = ByteLRU(cache_max_bytes)
+
+    async def put(self, files: Mapping[str, str]) -> dict[str, str]:
+        """Store the contents of ``{path: content}`` and return the ``{path: hash}`` manifest."""
+        manifest = {path: content_hash(content) for path, content in files.items()}
+        rows = {}
+        for path, content in files.items():
+            digest = manifest[path]
+            if digest not in rows:
+                data = content.encode()
+                rows[digest] = {"hash": digest, "data": zlib.compress(data), "size": len(data)}
+            self._cache.put(digest, content, len(content))
+        if rows:
+            async with AsyncSessionLocal() as db:
+                dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+                stmt = dialect.insert(FileBlob).on_conflict_do_nothing(index_elements=["hash"])
+                await db.execute(stmt, list(rows.values()))
+                await db.commit()
+        return manifest
+
+    async def get_many(self, hashes: Iterable[str], db: Optional[AsyncSession] = None) -> dict[str, str]:
+        """Return ``{hash: content}`` for the given hashes, fetching cache misses in one query.
+
+        Pass ``db`` to read through that session, e.g. one on the read replica.
+        """
+        contents = {}
+        missing = set()
+        for digest in hashes:
+            content = self._cache.get(digest)
+            if content is None:
+                missing.add(digest)
+            else:
+                contents[digest] = content
+        if missing:
+            stmt = select(FileBlob.hash, FileBlob.data).where(FileBlob.hash.in_(missing))
+            if db is None:
+                async with AsyncSessionLocal() as session:
+                    rows = (await session.execute(stmt)).all()
+            else:
+                rows = (await db.execute(stmt)).all()
+            for digest, data in rows:
+                content = zlib.decompress(data).decode()
+                self._cache.put(digest, content, len(content))
+                contents[digest] = content
+        return contents
+
+    async def materialize(self, manifest: Mapping[str, str]) -> dict[str, str]:
+        """Turn a ``{path: hash}`` manifest into ``{path: content}``."""
+        contents = await self.get_many(set(manifest.values()))
+        return {path: contents[digest] for path, digest in manifest.items() if digest in contents}
+
+    async def materialize_files(self, files: Mapping[str, str]) -> dict[str, str]:
+        """Files of a fragment: older fragments keep full contents, newer ones a ``{path: hash}`` manifest.
+
+        A manifest holds nothing but hashes, so a fragment with any other value
+        is an old one, even if some of its files happen to look like a hash.
+        """
+        if not all(_HASH.fullmatch(value) for value in files.values()):
+            return dict(files)
+        return await self.materialize(files)
+
+    async def materialize_state(self, state: Mapping[str, Any]) -> dict[str, str]:
+        """Files of a session: older sessions keep full contents under "files", newer ones a manifest."""
+        files = dict(state.get("files") or {})
+        files.update(await self.materialize(state.get(MANIFEST_KEY) or {}))
+        return files
+
+
+blob_store = BlobStore()
@@ -0,0 +1,151 @@
+import asyncio
+import re
+from collections import OrderedDict
+from typing import Any, Optional
+
+from pydantic import BaseModel, Field
+
+from app.core.config import settings
+
+MAX_DIAGNOSTICS = 50
+
+PORT_CHECK_COMMAND = "lsof -i :3000 | grep LISTEN"
+BUILD_CHECK_COMMAND = "npm run build --dry-run 2>&1"
+# --incremental keeps the compiler state between checks so only changed files are re-typechecked.
+TYPESCRIPT_CHECK_COMMAND = "npx tsc --noEmit --skipLibCheck --incremental --tsBuildInfoFile /tmp/agentx.tsbuildinfo 2>&1"
+FINGERPRINT_COMMAND = (
+    "find src public package.json tsconfig.json next.config.* -type f -printf '%p %T@ %s\\n' 2>/dev/null"
+    " | sort | md5sum"
+)
+
+TYPESCRIPT_ERROR = re.compile(r"^(?P<file>.+?)\((?P<line>\d+),(?P<column>\d+)\): error (?P<code>TS\d+): (?P<message>.*)$")
+BUILD_ERROR_LOCATION = re.compile(r"^(?P<file>\.?/?[\w./@-]+\.[jt]sx?):(?P<line>\d+):(?P<column>\d+)")
+
+
+class Diagnostic(BaseModel):
+    source: str = Field(..., description="The check that reported the problem: server, build or typescript.")
+    message: str = Field(..., description="What is wrong.")
+    file: Optional[str] = Field(None, description="File the problem is in, if known.")
+    line: Optional[int] = Field(None, description="1-based line number, if known.")
+    column: Optional[int] = Field(None, description="1-based column number, if known.")
+    code: Optional[str] = Field(None, description="Compiler error code, e.g. TS2322.")
+
+
+class ErrorCheckResult(BaseModel):
+    ok: bool = Field(..., description="Whether the app is free of errors.")
+    skipped: bool = Field(False, description="True when no file changed since the last clean check.")
+    diagnostics: list[Diagnostic] = Field(default_factory=list)
+    truncated: int = Field(0, description="Number of diagnostics left out of the list.")
+
+
+class ErrorChecker:
+    """Runs the app's error checks concurrently and remembers clean results.
+
+    The build and type checks are skipped when the source tree fingerprint
+    (paths, mtimes and sizes) matches the last clean result for the same
+    sandbox; the dev server is checked every time. Fingerprints are kept for
+    the ``max_size`` most recently checked sandboxes.
+    """
+
+    def __init__(self, max_size: int = settings.SANDBOX_CACHE_MAX_SIZE) -> None:
+        self.max_size = max_size
+        self._clean_fingerprints: "OrderedDict[str, str]" = OrderedDict()
+
+    async def check(self, sandbox: Any) -> ErrorCheckResult:
+        sandbox_id = sandbox.sandbox_id
+        fingerprint, server = await asyncio.gather(self._fingerprint(sandbox), self._check_server(sandbox))
+        if fingerprint and self._clean_fingerprints.get(sandbox_id) == fingerprint:
+            self._clean_fingerprints.move_to_end(sandbox_id)
+            # The sources are unchanged, so only the server can have gone down.
+            return ErrorCheckResult(ok=not server, skipped=True, diagnostics=server)
+
+        results = await asyncio.gather(
+            self._check_build(sandbox),
+            self._check_typescript(sandbox),
+        )
+        diagnostics = server + [diagnostic for result in results for diagnostic in result]
+        if diagnostics:
+            self.forget(sandbox_id)
+            return ErrorCheckResult(
+                ok=False,
+                diagnostics=diagnostics[:MAX_DIAGNOSTICS],
+                truncated=max(0, len(diagnostics) - MAX_DIAGNOSTICS),
+            )
+        if fingerprint:
+            self._clean_fingerprints[sandbox_id] = fingerprint
+            self._clean_fingerprints.move_to_end(sandbox_id)
+            while len(self._clean_fingerprints) > self.max_size:
+                self._clean_fingerprints.popitem(last=False)
+        return ErrorCheckResult(ok=True)
+
+    def forget(self, sandbox_id: str) -> None:
+        self._clean_fingerprints.pop(sandbox_id, None)
+
+    async def _fingerprint(self, sandbox: Any) -> Optional[str]:
+        try:
+            output, _ = await self._run(sandbox, FINGERPRINT_COMMAND)
+            return output.strip() or None
+        except Exception:
+            return None
+
+    async def _check_server(self, sandbox: Any) -> list[Diagnostic]:
+        output, _ = await self._run(sandbox, PORT_CHECK_COMMAND)
+        if not output.strip():
+            return [Diagnostic(source="server", message="App is not running on port 3000")]
+        return []
+
+    async def _check_build(self, sandbox: Any) -> list[Diagnostic]:
+        output, exit_code = await self._run(sandbox, BUILD_CHECK_COMMAND)
+        diagnostics = []
+        for line in output.splitlines():
+            if "error" not in line.lower():
+                continue
+            location = BUILD_ERROR_LOCATION.match(line.strip())
+            diagnostics.append(Diagnostic(
+                source="build",
+                message=line.strip(),
+                file=location["file"] if location else None,
+                line=int(location["line"]) if location else None,
+                column=int(location["column"]) if location else None,
+            ))
+        if exit_code != 0 and not diagnostics:
+            diagnostics.append(Diagnostic(source="build", message=_tail(output)))
+        return diagnostics
+
+    async def _check_typescript(self, sandbox: Any) -> list[Diagnostic]:
+        output, exit_code = await self._run(sandbox, TYPESCRIPT_CHECK_COMMAND)
+        diagnostics = []
+        for line in output.splitlines():
+            match = TYPESCRIPT_ERROR.match(line.strip())
+            if match:
+                diagnostics.append(Diagnostic(
+                    source="typescript",
+                    message=match["message"],
+                    file=match["file"],
+                    line=int(match["line"]),
+                    column=int(match["column"]),
+                    code=match["code"],
+                ))
+            elif diagnostics and line.startswith(" "):
+                # Continuation lines elaborate on the previous error.
+                diagnostics[-1].message += "\n" + line.strip()
+        if exit_code != 0 and not diagnostics:
+            diagnostics.append(Diagnostic(source="typescript", message=_tail(output)))
+        return diagnostics
+
+    async def _run(self, sandbox: Any, command: str) -> tuple[str, int]:
+        """Run a command and return its output and exit code instead of raising on failure."""
+        try:
+            result = await sandbox.commands.run(command)
+        except Exception as e:
+            if not hasattr(e, "exit_code"):
+                raise
+            result = e
+        return (result.stdout or "") + (result.stderr or ""), result.exit_code
+
+
+def _tail(output: str, limit: int = 2000) -> str:
+    return output[-limit:].strip() or "Command failed without output"
+
+
+error_checker = ErrorChecker()
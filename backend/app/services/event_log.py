@@ -0,0 +1,325 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, AsyncIterator, Dict, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.database import AgentRun, RunStatus, WorkflowEvent
+
+logger = logging.getLogger(__name__)
+
+
+class ActionType(str, Enum):
+    MESSAGE = "message"
+    FILE_WRITE = "file_write"
+    FILE_READ= "file_read"
+    TERMINAL = "terminal"
+    COMPLETE = "complete"
+    ERROR = "error"
+
+
+def create_event(
+    action: ActionType,
+    message: str,
+    data: Optional[Dict[str, Any]] = None
+) -> str:
+    """Create the JSON payload of a workflow event with structured action data."""
+    event_data = {
+        "action": action.value,
+        "message": message,
+        "timestamp": time.time(),
+    }
+    if data:
+        event_data["data"] = data
+    return json.dumps(event_data)
+
+
+class EventLogBacklogError(RuntimeError):
+    """Raised when too many events of a run could not be written to the database."""
+
+
+@dataclass
+class RunEvent:
+    id: int
+    payload: str
+
+
+class RunEventLog:
+    """Ordered events of one workflow run.
+
+    Events get consecutive ids starting at 1. Only the most recent
+    ``memory_limit`` events stay in memory; older ones are served from the
+    database once the store has persisted them. Events that are not persisted
+    yet can't be dropped, so while the database is unreachable the run is
+    failed (see ``check_backlog``) rather than letting them pile up.
+    """
+
+    def __init__(
+        self,
+        run_id: uuid.UUID,
+        project_id: uuid.UUID,
+        memory_limit: int = settings.EVENT_LOG_MEMORY_LIMIT,
+        start_after: int = 0,
+        max_backlog: int = settings.EVENT_LOG_MAX_BACKLOG,
+    ) -> None:
+        self.run_id = run_id
+        self.project_id = project_id
+        self.memory_limit = memory_limit
+        self.max_backlog = max_backlog
+        self.closed = False
+        # A retried run continues after the events its earlier attempts persisted.
+        self.last_id = start_after
+        self.persisted_id = start_after
+        self._events: deque[RunEvent] = deque()
+        self._changed = asyncio.Event()
+
+    @property
+    def first_id(self) -> int:
+        """Id of the oldest event still held in memory."""
+        return self._events[0].id if self._events else self.last_id + 1
+
+    def append(self, payload: str) -> RunEvent:
+        self.last_id += 1
+        event = RunEvent(self.last_id, payload)
+        self._events.append(event)
+        # Only events already in the database may be dropped from memory.
+        while len(self._events) > self.memory_limit and self._events[0].id <= self.persisted_id:
+            self._events.popleft()
+        self._notify()
+        return event
+
+    def close(self) -> None:
+        self.closed = True
+        self._notify()
+
+    def check_backlog(self) -> None:
+        """Raise EventLogBacklogError when more than ``max_backlog`` events are waiting to be persisted."""
+        backlog = self.last_id - self.persisted_id
+        if backlog > self.max_backlog:
+            raise EventLogBacklogError(f"{backlog} events of run {self.run_id} could not be saved")
+
+    def unpersisted(self) -> list[RunEvent]:
+        return [event for event in self._events if event.id > self.persisted_id]
+
+    def since(self, after: int) -> list[RunEvent]:
+        return [event for event in self._events if event.id > after]
+
+    async def wait(self, after: int, timeout: float) -> list[RunEvent]:
+        """Return events newer than ``after``, waiting up to ``timeout`` seconds for one to arrive."""
+        if self.last_id <= after and not self.closed:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.since(after)
+
+    def _notify(self) -> None:
+        # Wake everyone waiting on the current event and give later waiters a fresh one.
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+
+class EventLogStore:
+    """Holds the event logs of recent runs and persists their events in batches.
+
+    Logs of finished runs stay in memory for ``retention`` seconds so that
+    reconnecting clients are served without touching the database.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = settings.EVENT_LOG_FLUSH_INTERVAL,
+        retention: int = settings.EVENT_LOG_RETENTION,
+    ) -> None:
+        self.flush_interval = flush_interval
+        self.retention = retention
+        self._logs: dict[uuid.UUID, RunEventLog] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self._created = asyncio.Event()
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_periodically())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def create(self, project_id: uuid.UUID, run_id: Optional[uuid.UUID] = None, start_after: int = 0) -> RunEventLog:
+        log = RunEventLog(run_id or uuid.uuid4(), project_id, start_after=start_after)
+        self._logs[log.run_id] = log
+        # Wake streams waiting for a run of this process to start.
+        created, self._created = self._created, asyncio.Event()
+        created.set()
+        return log
+
+    def get(self, run_id: uuid.UUID) -> Optional[RunEventLog]:
+        return self._logs.get(run_id)
+
+    async def wait_for(self, run_id: uuid.UUID, timeout: float) -> Optional[RunEventLog]:
+        """Return the run's log, waiting up to ``timeout`` seconds for this process to start the run."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while (log := self._logs.get(run_id)) is None:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+            try:
+                await asyncio.wait_for(self._created.wait(), remaining)
+            except asyncio.TimeoutError:
+                return None
+        return log
+
+    def close(self, log: RunEventLog) -> None:
+        """Mark the run finished and forget it after the retention period."""
+        log.close()
+        asyncio.get_running_loop().call_later(self.retention, self._forget, log)
+
+    async def flush(self) -> None:
+        """Write every event not yet in the database in one multi-row insert."""
+        # Shielded: a batch that was committed must also be marked persisted, or it would be written twice.
+        await asyncio.shield(self._flush())
+
+    async def _flush(self) -> None:
+        async with self._flush_lock:
+            logs = [(log, log.unpersisted()) for log in list(self._logs.values())]
+            rows = [
+                {"run_id": log.run_id, "seq": event.id, "project_id": log.project_id, "payload": event.payload}
+                for log, events in logs for event in events
+            ]
+            if not rows:
+                return
+            async with AsyncSessionLocal() as db:
+                # A run given up by the heartbeat may have gotten its error event from
+                # another worker under a sequence number this one also used.
+                dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+                await db.execute(dialect.insert(WorkflowEvent).on_conflict_do_nothing(index_elements=["run_id", "seq"]), rows)
+                await db.commit()
+            for log, events in logs:
+                if events:
+                    log.persisted_id = events[-1].id
+
+    async def load(self, run_id: uuid.UUID, after: int, before: Optional[int] = None) -> list[RunEvent]:
+        """Load persisted events with after < id < before."""
+        stmt = select(WorkflowEvent.seq, WorkflowEvent.payload).where(
+            WorkflowEvent.run_id == run_id, WorkflowEvent.seq > after
+        ).order_by(WorkflowEvent.seq)
+        if before is not None:
+            stmt = stmt.where(WorkflowEvent.seq < before)
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(stmt)
+            return [RunEvent(seq, payload) for seq, payload in result.all()]
+
+    async def last_seq(self, run_id: uuid.UUID) -> int:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(func.max(WorkflowEvent.seq)).where(WorkflowEvent.run_id == run_id))
+            return result.scalar() or 0
+
+    async def has_run(self, run_id: uuid.UUID, project_id: uuid.UUID) -> bool:
+        log = self.get(run_id)
+        if log:
+            return log.project_id == project_id
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(AgentRun.id).where(AgentRun.id == run_id, AgentRun.project_id == project_id))
+            if result.first() is not None:
+                return True
+            result = await db.execute(
+                select(WorkflowEvent.seq).where(WorkflowEvent.run_id == run_id, WorkflowEvent.project_id == project_id).limit(1)
+            )
+            return result.first() is not None
+
+    async def is_finished(self, run_id: uuid.UUID) -> bool:
+        """Whether the run can produce no more events. Runs without a queue entry count as finished."""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(AgentRun.status).where(AgentRun.id == run_id))
+            status = result.scalar_one_or_none()
+            return status not in (RunStatus.QUEUED, RunStatus.RUNNING)
+
+    def _forget(self, log: RunEventLog) -> None:
+        if log.persisted_id < log.last_id:
+            # Not written yet; try again after the next flush.
+            asyncio.get_running_loop().call_later(self.flush_interval, self._forget, log)
+            return
+        self._logs.pop(log.run_id, None)
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to persist workflow events")
+
+
+def format_sse(run_id: uuid.UUID, event: RunEvent) -> str:
+    return f"id: {run_id}:{event.id}\ndata: {event.payload}\n\n"
+
+
+def parse_last_event_id(last_event_id: Optional[str]) -> int:
+    """Accept both '<run_id>:<seq>' and a bare '<seq>'."""
+    if not last_event_id:
+        return 0
+    try:
+        return int(last_event_id.rsplit(":", 1)[-1])
+    except ValueError:
+        return 0
+
+
+async def stream_run_events(
+    store: "EventLogStore",
+    run_id: uuid.UUID,
+    last_event_id: Optional[str] = None,
+    heartbeat: float = settings.SSE_HEARTBEAT_INTERVAL,
+    poll_interval: float = settings.EVENT_LOG_POLL_INTERVAL,
+) -> AsyncIterator[str]:
+    """Replay a run's events after ``last_event_id``, then follow the run with heartbeats."""
+    after = parse_last_event_id(last_event_id)
+    idle = 0.0
+    log = store.get(run_id)
+    while log is None:
+        # Queued, running in another process, or finished: follow the database
+        # until a worker of this process picks the run up.
+        finished = await store.is_finished(run_id)
+        events = await store.load(run_id, after)
+        for event in events:
+            yield format_sse(run_id, event)
+            after = event.id
+        if finished:
+            return
+        idle = 0.0 if events else idle + poll_interval
+        if idle >= heartbeat:
+            yield ": keepalive\n\n"
+            idle = 0.0
+        log = await store.wait_for(run_id, poll_interval)
+    while True:
+        if after + 1 < log.first_id:
+            # Fell behind what is still held in memory.
+            for event in await store.load(run_id, after, log.first_id):
+                yield format_sse(run_id, event)
+                after = event.id
+        events = await log.wait(after, heartbeat)
+        if events and events[0].id > after + 1:
+            continue
+        if not events:
+            if log.closed and after >= log.last_id:
+                return
+            yield ": keepalive\n\n"
+            continue
+        for event in events:
+            yield format_sse(run_id, event)
+            after = event.id
+
+event_log_store = EventLogStore()
@@ -0,0 +1,121 @@
+import posixpath
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Hashable, Optional
+
+from app.core.config import settings
+
+SANDBOX_HOME = "/home/user"
+
+# (modified time, size) as reported by the sandbox filesystem
+FileVersion = tuple[float, int]
+
+
+def normalize_path(path: str) -> str:
+    """Resolve a sandbox path the same way the sandbox does: relative paths start at the home dir."""
+    return posixpath.normpath(posixpath.join(SANDBOX_HOME, path))
+
+
+@dataclass
+class _Entry:
+    content: str
+    version: Optional[FileVersion]
+    generation: int
+
+
+class ByteLRU:
+    """OrderedDict-based LRU bounded by the total length of the cached strings."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes: dict[Hashable, int] = {}
+        self._bytes = 0
+
+    def get(self, key: Hashable) -> Any:
+        value = self._data.get(key)
+        if value is not None:
+            self._data.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Any, size: int) -> None:
+        self.pop(key)
+        if size > self.max_bytes:
+            return
+        self._data[key] = value
+        self._sizes[key] = size
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            old_key, _ = self._data.popitem(last=False)
+            self._bytes -= self._sizes.pop(old_key)
+
+    def pop(self, key: Hashable) -> None:
+        if key in self._data:
+            del self._data[key]
+            self._bytes -= self._sizes.pop(key)
+
+
+class FileContentCache:
+    """Caches sandbox file contents to save read round-trips.
+
+    Content this process wrote is trusted without asking the sandbox until
+    a terminal command runs there or a new run starts on it (see
+    ``mark_stale``). Content read from the sandbox is always revalidated
+    against the file's modification time and size, because another process
+    (a worker, while this one serves the file explorer) may have changed
+    it. Files that were never written by us are also shared across every
+    sandbox built from the same template, keyed by path and version.
+    """
+
+    def __init__(self, max_bytes: int = settings.FILE_CACHE_MAX_BYTES) -> None:
+        self._files = ByteLRU(max_bytes // 2)
+        self._template_files = ByteLRU(max_bytes // 2)
+        self._generations: dict[str, int] = {}
+        self._written: dict[str, set[str]] = {}
+
+    def get_trusted(self, sandbox_id: str, path: str) -> Optional[str]:
+        """Return content this process wrote if nothing can have changed it since."""
+        entry = self._files.get((sandbox_id, normalize_path(path)))
+        if entry and entry.version is None and entry.generation == self._generations.get(sandbox_id, 0):
+            return entry.content
+        return None
+
+    def get(self, sandbox_id: str, path: str, template: str, version: FileVersion) -> Optional[str]:
+        """Return the cached content for this exact version of the file."""
+        path = normalize_path(path)
+        entry = self._files.get((sandbox_id, path))
+        if entry and entry.version == version:
+            return entry.content
+        if path in self._written.get(sandbox_id, ()):
+            return None
+        content = self._template_files.get((template, path, version))
+        if content is not None:
+            self._store(sandbox_id, path, content, version)
+        return content
+
+    def put(self, sandbox_id: str, path: str, template: str, version: FileVersion, content: str) -> None:
+        """Cache content read from the sandbox."""
+        path = normalize_path(path)
+        self._store(sandbox_id, path, content, version)
+        if path not in self._written.get(sandbox_id, ()):
+            self._template_files.put((template, path, version), content, len(content))
+
+    def put_written(self, sandbox_id: str, path: str, content: str) -> None:
+        """Cache content we just wrote; it is trusted as-is until the sandbox goes stale."""
+        path = normalize_path(path)
+        self._written.setdefault(sandbox_id, set()).add(path)
+        self._store(sandbox_id, path, content, None)
+
+    def invalidate(self, sandbox_id: str, path: str) -> None:
+        self._files.pop((sandbox_id, normalize_path(path)))
+
+    def mark_stale(self, sandbox_id: str) -> None:
+        """Something outside our control may have changed files; revalidate before the next hit."""
+        self._generations[sandbox_id] = self._generations.get(sandbox_id, 0) + 1
+
+    def _store(self, sandbox_id: str, path: str, content: str, version: Optional[FileVersion]) -> None:
+        entry = _Entry(content, version, self._generations.get(sandbox_id, 0))
+        self._files.put((sandbox_id, path), entry, len(content))
+
+
+file_cache = FileContentCache()
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Optional
+
+from sqlalchemy import insert
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.utils import utcnow
+from app.models.database import Fragment, Message, MessageRole, MessageType
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class HistoryRecord:
+    """One chat turn: the user's prompt, the assistant's reply and what it built."""
+    project_id: uuid.UUID
+    prompt: str
+    result: str
+    result_type: MessageType = MessageType.RESULT
+    fragment: Optional[dict[str, Any]] = None
+    prompted_at: datetime = field(default_factory=utcnow)
+    completed_at: datetime = field(default_factory=utcnow)
+
+
+class HistoryWriter:
+    """Persists chat history behind the request path.
+
+    Records are queued in memory and written by a background task in batches,
+    one multi-row INSERT per table per batch. The queue is bounded: when the
+    database falls behind, ``submit`` waits for room instead of growing
+    without limit. Failed batches are retried with backoff; a batch that
+    still fails is written record by record, so that only the records that
+    cannot be stored (say, of a project deleted meanwhile) are dropped.
+    """
+
+    def __init__(
+        self,
+        max_queue_size: int = settings.HISTORY_QUEUE_MAX_SIZE,
+        batch_size: int = settings.HISTORY_BATCH_SIZE,
+        max_retries: int = settings.HISTORY_MAX_RETRIES,
+    ) -> None:
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self._queue: asyncio.Queue[HistoryRecord] = asyncio.Queue(max_queue_size)
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._write_batches())
+
+    async def stop(self) -> None:
+        """Write everything still queued, then stop the writer."""
+        if self._task:
+            await self._queue.join()
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def submit(self, record: HistoryRecord) -> None:
+        await self._queue.put(record)
+
+    async def write(self, records: list[HistoryRecord]) -> None:
+        """Insert the records' messages and fragments in one transaction."""
+        messages = []
+        fragments = []
+        for record in records:
+            # Explicit timestamps keep the prompt ahead of the reply; now() is the same for the whole transaction.
+            messages.append({
+                "id": uuid.uuid4(),
+                "project_id": record.project_id,
+                "content": record.prompt,
+                "role": MessageRole.USER,
+                "type": MessageType.RESULT,
+                "created_at": record.prompted_at,
+            })
+            result_id = uuid.uuid4()
+            messages.append({
+                "id": result_id,
+                "project_id": record.project_id,
+                "content": record.result,
+                "role": MessageRole.ASSISTANT,
+                "type": record.result_type,
+                "created_at": record.completed_at,
+            })
+            if record.fragment:
+                fragments.append({"message_id": result_id, "created_at": record.completed_at, **record.fragment})
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(Message), messages)
+            if fragments:
+                await db.execute(insert(Fragment), fragments)
+            await db.commit()
+
+    async def _write_batches(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await self._write_with_retries(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _write_with_retries(self, batch: list[HistoryRecord]) -> None:
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self.write(batch)
+                return
+            except Exception:
+                if attempt == self.max_retries:
+                    break
+                logger.warning("Writing chat history failed, retrying", exc_info=True)
+                await asyncio.sleep(0.5 * 2 ** attempt)
+        if len(batch) == 1:
+            logger.exception("Dropping a chat history record of project %s after %d attempts", batch[0].project_id, attempt + 1)
+            return
+        logger.warning("Writing %d chat history records failed, writing them one by one", len(batch), exc_info=True)
+        for record in batch:
+            try:
+                await self.write([record])
+            except Exception:
+                logger.exception("Dropping a chat history record of project %s", record.project_id)
+
+
+history_writer = HistoryWriter()
@@ -0,0 +1,166 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+
+from app.core.config import settings
+from app.core.telemetry import LLM_CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+
+def _strip_ids(content: dict) -> dict:
+    """Drop the random ids ADK gives function calls and responses, so identical turns hash alike."""
+    for part in content.get("parts", []):
+        for field in ("function_call", "function_response"):
+            if field in part:
+                part[field].pop("id", None)
+    return content
+
+
+def _content_key(content: Any, match_tool_results: bool) -> Any:
+    data = _strip_ids(content.model_dump(mode="json", exclude_none=True))
+    if not match_tool_results:
+        for part in data.get("parts", []):
+            if "function_response" in part:
+                part["function_response"] = {"name": part["function_response"].get("name")}
+    return data
+
+
+class LlmResponseCache:
+    """Records model responses and replays them for identical requests.
+
+    The key hashes the model name, system instruction, tool names and the
+    whole conversation including tool results. Entries are kept in an LRU
+    bounded by ``max_entries`` and expire after ``ttl`` seconds; with a
+    ``directory`` they are also written to disk and survive restarts.
+
+    With ``match_tool_results`` off, tool results only contribute their tool
+    name, so a recorded run replays the same tool calls against a fresh
+    sandbox even when command output differs.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = settings.LLM_CACHE_MAX_ENTRIES,
+        ttl: int = settings.LLM_CACHE_TTL,
+        directory: Optional[str] = settings.LLM_CACHE_DIR,
+        match_tool_results: bool = settings.LLM_CACHE_MATCH_TOOL_RESULTS,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.directory = Path(directory) if directory else None
+        self.match_tool_results = match_tool_results
+        self._entries: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+        # Key of the request each agent is waiting on, so the response can be stored under it.
+        self._pending: "OrderedDict[tuple[str, str], str]" = OrderedDict()
+
+    def key(self, llm_request: LlmRequest) -> str:
+        config = llm_request.config
+        instruction = config.system_instruction if config else None
+        if instruction is not None and not isinstance(instruction, str):
+            instruction = instruction.model_dump(mode="json", exclude_none=True)
+        tools = sorted(
+            declaration.name
+            for tool in (config.tools if config and config.tools else [])
+            for declaration in (getattr(tool, "function_declarations", None) or [])
+        )
+        payload = {
+            "model": llm_request.model,
+            "instruction": instruction,
+            "tools": tools,
+            "contents": [_content_key(content, self.match_tool_results) for content in llm_request.contents],
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    async def get(self, key: str) -> Optional[LlmResponse]:
+        entry = self._entries.get(key)
+        if entry is None and self.directory:
+            entry = await asyncio.to_thread(self._read, key)
+            if entry:
+                self._store(key, entry)
+        if entry is None:
+            return None
+        created_at, data = entry
+        if time.time() - created_at > self.ttl:
+            self._entries.pop(key, None)
+            if self.directory:
+                await asyncio.to_thread(self._path(key).unlink, missing_ok=True)
+            return None
+        self._entries.move_to_end(key)
+        return LlmResponse.model_validate(data)
+
+    async def put(self, key: str, response: LlmResponse) -> None:
+        data = response.model_dump(
+            mode="json", exclude_none=True, include={"content", "finish_reason", "usage_metadata", "model_version"},
+        )
+        _strip_ids(data["content"])
+        entry = (time.time(), data)
+        self._store(key, entry)
+        if self.directory:
+            try:
+                await asyncio.to_thread(self._write, key, entry)
+            except OSError:
+                logger.warning("Failed to persist LLM cache entry %s", key, exc_info=True)
+
+    async def before_model(self, callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+        """ADK before_model_callback: answer from the cache, or remember the key to record the response."""
+        key = self.key(llm_request)
+        response = await self.get(key)
+        LLM_CACHE_REQUESTS.labels("hit" if response else "miss").inc()
+        if response:
+            response.custom_metadata = {**(response.custom_metadata or {}), "llm_cache": "hit"}
+            return response
+        self._pending[(callback_context.invocation_id, callback_context.agent_name)] = key
+        # Calls that failed never reach after_model; don't let their keys pile up.
+        while len(self._pending) > self.max_entries:
+            self._pending.popitem(last=False)
+        return None
+
+    async def after_model(self, callback_context: CallbackContext, llm_response: LlmResponse) -> Optional[LlmResponse]:
+        """ADK after_model_callback: record complete, successful responses."""
+        if llm_response.partial:
+            return None
+        key = self._pending.pop((callback_context.invocation_id, callback_context.agent_name), None)
+        if key and llm_response.content and not llm_response.error_code:
+            await self.put(key, llm_response)
+        return None
+
+    def _store(self, key: str, entry: tuple[float, dict]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def _read(self, key: str) -> Optional[tuple[float, dict]]:
+        try:
+            data = json.loads(self._path(key).read_text())
+            return data["created_at"], data["response"]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError):
+            logger.warning("Ignoring unreadable LLM cache entry %s", key, exc_info=True)
+            return None
+
+    def _write(self, key: str, entry: tuple[float, dict]) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Written to a temporary file first so readers never see half an entry.
+        tmp = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        tmp.write_text(json.dumps({"created_at": entry[0], "response": entry[1]}))
+        tmp.replace(path)
+
+
+llm_cache = LlmResponseCache()
@@ -0,0 +1,57 @@
+from collections import deque
+
+from app.core.config import settings
+
+
+class OutputBuffer:
+    """Captures command output up to a size cap, keeping its head and its tail.
+
+    Chunks are stored as a list instead of being concatenated, so capture stays
+    linear in the output size. Once the cap is reached, the middle of the
+    output is dropped and replaced by a truncation marker.
+    """
+
+    def __init__(self, max_chars: int = settings.COMMAND_OUTPUT_MAX_CHARS) -> None:
+        self.head_limit = max_chars // 2
+        self.tail_limit = max_chars - self.head_limit
+        self.clear()
+
+    def __len__(self) -> int:
+        """Characters written since the buffer was created or cleared, including dropped ones."""
+        return self._head_size + self._tail_size + self.dropped
+
+    def clear(self) -> None:
+        self.dropped = 0
+        self._head: list[str] = []
+        self._head_size = 0
+        self._tail: deque[str] = deque()
+        self._tail_size = 0
+
+    def write(self, data: str) -> None:
+        if self._head_size < self.head_limit:
+            head = data[:self.head_limit - self._head_size]
+            self._head.append(head)
+            self._head_size += len(head)
+            data = data[len(head):]
+        if not data:
+            return
+        self._tail.append(data)
+        self._tail_size += len(data)
+        while self._tail_size > self.tail_limit:
+            excess = self._tail_size - self.tail_limit
+            first = self._tail[0]
+            if len(first) <= excess:
+                self._tail.popleft()
+                removed = len(first)
+            else:
+                self._tail[0] = first[excess:]
+                removed = excess
+            self._tail_size -= removed
+            self.dropped += removed
+
+    def getvalue(self) -> str:
+        head = "".join(self._head)
+        tail = "".join(self._tail)
+        if self.dropped:
+            return f"{head}\n... [{self.dropped} characters truncated] ...\n{tail}"
+        return head + tail
@@ -0,0 +1,82 @@
+import asyncio
+import uuid
+import zlib
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import lock_engine
+
+# First key of the two-key advisory locks, so that the lock kinds never collide.
+RUN_LOCK = 1
+SUBMIT_LOCK = 2
+
+
+def lock_key(project_id: uuid.UUID) -> int:
+    """32-bit signed advisory lock key for a project."""
+    key = zlib.crc32(project_id.bytes)
+    return key - (1 << 32) if key >= (1 << 31) else key
+
+
+class ProjectLocks:
+    """Mutual exclusion per project, within this process and across processes.
+
+    In-process asyncio locks keep tasks of one worker apart; Postgres
+    advisory locks do the same for every worker sharing the database. On
+    other databases only the in-process part applies.
+    """
+
+    def __init__(self) -> None:
+        self._running: dict[uuid.UUID, asyncio.Lock] = {}
+        # Lock and number of tasks using it, so the lock is dropped only when nobody waits on it.
+        self._submitting: dict[uuid.UUID, list] = {}
+
+    @asynccontextmanager
+    async def running(self, project_id: uuid.UUID) -> AsyncIterator[bool]:
+        """Try to become the only run of the project; yields whether that worked.
+
+        The advisory lock is held on a dedicated connection from ``lock_engine``
+        for as long as the block runs, so it is released even if this process
+        dies.
+        """
+        lock = self._running.setdefault(project_id, asyncio.Lock())
+        if lock.locked():
+            yield False
+            return
+        async with lock:
+            try:
+                if lock_engine.dialect.name != "postgresql":
+                    yield True
+                    return
+                async with lock_engine.connect() as conn:
+                    key = lock_key(project_id)
+                    acquired = (await conn.execute(select(func.pg_try_advisory_lock(RUN_LOCK, key)))).scalar()
+                    await conn.commit()
+                    try:
+                        yield bool(acquired)
+                    finally:
+                        if acquired:
+                            await conn.execute(select(func.pg_advisory_unlock(RUN_LOCK, key)))
+                            await conn.commit()
+            finally:
+                self._running.pop(project_id, None)
+
+    @asynccontextmanager
+    async def submitting(self, db: AsyncSession, project_id: uuid.UUID) -> AsyncIterator[None]:
+        """Serialize submissions for a project until ``db`` commits or rolls back."""
+        entry = self._submitting.setdefault(project_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                if db.get_bind().dialect.name == "postgresql":
+                    await db.execute(select(func.pg_advisory_xact_lock(SUBMIT_LOCK, lock_key(project_id))))
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                self._submitting.pop(project_id, None)
+
+
+project_locks = ProjectLocks()
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import math
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import case
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.database import Usage
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class QuotaPolicy:
+    name: str
+    points: int
+    duration: int
+
+    @property
+    def rate(self) -> float:
+        """Points refilled per second."""
+        return self.points / self.duration
+
+
+@dataclass
+class QuotaResult:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset: int
+    retry_after: int = 0
+
+    def headers(self) -> dict[str, str]:
+        headers = {
+            "RateLimit-Limit": str(self.limit),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(self.reset),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(self.retry_after)
+        return headers
+
+
+@dataclass(eq=False)
+class _Bucket:
+    policy: QuotaPolicy
+    tokens: float
+    updated: float = field(default_factory=time.monotonic)
+    # Points consumed here but not yet added to the usage table.
+    pending: int = 0
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.policy.points, self.tokens + (now - self.updated) * self.policy.rate)
+        self.updated = now
+
+
+class QuotaEngine:
+    """Per-key point budgets, enforced in process and shared through the usage table.
+
+    Each key has a token bucket in memory, so admission never waits on the
+    database. Consumed points are added to the key's row in ``usage`` in
+    batches: one multi-row atomic upsert per sync, which also returns what
+    every process has consumed in the current window (``expire`` holds the
+    window's end). A bucket never holds more than the window's remaining
+    budget, so all processes together stay within the limit up to one sync
+    interval of drift.
+    """
+
+    def __init__(self, sync_interval: float = settings.RATE_LIMIT_SYNC_INTERVAL) -> None:
+        self.sync_interval = sync_interval
+        self._buckets: dict[str, _Bucket] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._sync_periodically())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.sync()
+
+    def consume(self, policy: QuotaPolicy, client: str, cost: int = 1) -> QuotaResult:
+        key = f"{policy.name}:{client}"
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _Bucket(policy, float(policy.points))
+        bucket.refill(time.monotonic())
+        allowed = bucket.tokens >= cost
+        if allowed:
+            bucket.tokens -= cost
+            bucket.pending += cost
+        return self._result(bucket, allowed, cost)
+
+    def refund(self, policy: QuotaPolicy, client: str, cost: int = 1) -> Optional[QuotaResult]:
+        """Give back points consumed for a request that turned out to cost nothing."""
+        bucket = self._buckets.get(f"{policy.name}:{client}")
+        if bucket is None:
+            return None
+        bucket.refill(time.monotonic())
+        bucket.tokens = min(policy.points, bucket.tokens + cost)
+        # Points already synced stay counted in the shared window until it expires.
+        bucket.pending -= min(cost, bucket.pending)
+        return self._result(bucket, True, cost)
+
+    def _result(self, bucket: _Bucket, allowed: bool, cost: int) -> QuotaResult:
+        policy = bucket.policy
+        missing = policy.points - bucket.tokens
+        return QuotaResult(
+            allowed=allowed,
+            limit=policy.points,
+            remaining=int(bucket.tokens),
+            reset=math.ceil(missing / policy.rate),
+            retry_after=0 if allowed else math.ceil((cost - bucket.tokens) / policy.rate),
+        )
+
+    async def sync(self) -> None:
+        """Add pending consumption to the usage table and cap buckets by the shared window budget."""
+        pending = {key: bucket for key, bucket in self._buckets.items() if bucket.pending}
+        if not pending:
+            self._forget_idle()
+            return
+        now = datetime.now(timezone.utc)
+        rows = [
+            {
+                "key": key,
+                "points": bucket.pending,
+                "expire": (now + timedelta(seconds=bucket.policy.duration)).isoformat(),
+            }
+            for key, bucket in pending.items()
+        ]
+        counts = {key: bucket.pending for key, bucket in pending.items()}
+        for bucket in pending.values():
+            bucket.pending = 0
+        try:
+            usage = await self._upsert(rows, now.isoformat())
+        except Exception:
+            # Keep the points for the next attempt.
+            for key, count in counts.items():
+                self._buckets[key].pending += count
+            raise
+        for key, points in usage.items():
+            bucket = self._buckets.get(key)
+            if bucket:
+                bucket.tokens = min(bucket.tokens, max(0, bucket.policy.points - points))
+        self._forget_idle()
+
+    async def _upsert(self, rows: list[dict], now: str) -> dict[str, int]:
+        async with AsyncSessionLocal() as db:
+            dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+            stmt = dialect.insert(Usage).values(rows)
+            # ISO-8601 UTC timestamps compare correctly as strings.
+            expired = Usage.expire < now
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Usage.key],
+                set_={
+                    "points": case((expired, stmt.excluded.points), else_=Usage.points + stmt.excluded.points),
+                    "expire": case((expired, stmt.excluded.expire), else_=Usage.expire),
+                },
+            ).returning(Usage.key, Usage.points)
+            result = await db.execute(stmt)
+            usage = dict(result.all())
+            await db.commit()
+            return usage
+
+    def _forget_idle(self) -> None:
+        """Drop buckets that are full again and have nothing left to sync."""
+        now = time.monotonic()
+        for key, bucket in list(self._buckets.items()):
+            if not bucket.pending and now - bucket.updated > bucket.policy.duration:
+                del self._buckets[key]
+
+    async def _sync_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.sync()
+            except Exception:
+                logger.exception("Failed to sync usage")
+
+
+CHAT_QUOTA = QuotaPolicy("chat", settings.RATE_LIMIT_CHAT_POINTS, settings.RATE_LIMIT_CHAT_DURATION)
+FILES_QUOTA = QuotaPolicy("files", settings.RATE_LIMIT_FILES_POINTS, settings.RATE_LIMIT_FILES_DURATION)
+
+quota_engine = QuotaEngine()
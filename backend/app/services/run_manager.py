@@ -0,0 +1,349 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from contextlib import aclosing
+from datetime import timedelta
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import and_, exists, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.utils import utcnow
+from app.models.database import AgentRun, MessageType, Project, RunStatus, WorkflowEvent
+from app.services.event_log import ActionType, EventLogStore, RunEventLog, create_event, event_log_store
+from app.services.history_writer import HistoryRecord, history_writer
+from app.services.project_lock import project_locks
+from app.services.sandbox_leases import sandbox_leases
+
+logger = logging.getLogger(__name__)
+
+
+class RunManager:
+    """Queues agent runs in Postgres and works them off in a pool of background workers.
+
+    Submitting only inserts an ``agent_runs`` row, so any API process can
+    accept work while any process with workers enabled executes it. A worker
+    claims the oldest queued run with ``FOR UPDATE SKIP LOCKED``, and never a
+    run whose project already has one running, so each project's messages
+    are handled one at a time and in order. Every event a run produces goes
+    into its event log, from where clients follow it over SSE.
+
+    Workers heartbeat their runs; runs whose worker stopped heartbeating, or
+    that were interrupted by a shutdown, go back to the queue; a run whose
+    worker stopped heartbeating on ``max_attempts`` attempts is failed. While a run
+    executes, its worker holds the project's lease in the sandbox lease
+    registry, renewed by the same heartbeat.
+    """
+
+    def __init__(
+        self,
+        store: EventLogStore = event_log_store,
+        concurrency: int = settings.RUN_WORKER_CONCURRENCY,
+        poll_interval: float = settings.RUN_QUEUE_POLL_INTERVAL,
+        heartbeat_interval: int = settings.RUN_HEARTBEAT_INTERVAL,
+        stale_after: int = settings.RUN_STALE_AFTER,
+        max_attempts: int = settings.RUN_MAX_ATTEMPTS,
+    ) -> None:
+        self.store = store
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        # Project of every run this process is executing, by run id.
+        self._active: dict[uuid.UUID, uuid.UUID] = {}
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self) -> None:
+        """Start the worker pool and the heartbeat."""
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+            self._tasks.append(asyncio.create_task(self._heartbeat()))
+
+    async def stop(self) -> None:
+        """Stop the workers; runs still in flight go back to the queue."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, project_id: uuid.UUID, message: str, idempotency_key: Optional[str] = None) -> tuple[AgentRun, bool]:
+        """Queue a run, or return the run that already handles this request, and whether the run is new.
+
+        With an idempotency key, the project's earlier run with the same key
+        is returned; reusing the key for a different message is a 422. Without
+        one, a message identical to a queued or running run of the project
+        attaches to that run.
+        """
+        async with AsyncSessionLocal() as db:
+            async with project_locks.submitting(db, project_id):
+                run = await self._find_duplicate(db, project_id, message, idempotency_key)
+                if run is not None and run.message != message:
+                    raise HTTPException(status_code=422, detail="Idempotency key was already used for a different message")
+                created = run is None
+                if created:
+                    run = AgentRun(
+                        project_id=project_id,
+                        message=message,
+                        idempotency_key=idempotency_key,
+                        status=RunStatus.QUEUED,
+                        attempts=0,
+                    )
+                    db.add(run)
+                    self._wakeup.set()
+                await db.commit()
+        return run, created
+
+    async def get(self, run_id: uuid.UUID, project_id: uuid.UUID) -> Optional[AgentRun]:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(AgentRun).where(AgentRun.id == run_id, AgentRun.project_id == project_id))
+            return result.scalar_one_or_none()
+
+    async def _find_duplicate(
+        self, db: AsyncSession, project_id: uuid.UUID, message: str, idempotency_key: Optional[str]
+    ) -> Optional[AgentRun]:
+        stmt = select(AgentRun).where(AgentRun.project_id == project_id)
+        if idempotency_key:
+            stmt = stmt.where(AgentRun.idempotency_key == idempotency_key)
+        else:
+            stmt = stmt.where(AgentRun.message == message, AgentRun.status.in_([RunStatus.QUEUED, RunStatus.RUNNING]))
+        result = await db.execute(stmt.order_by(AgentRun.created_at.desc()).limit(1))
+        return result.scalar_one_or_none()
+
+    async def claim(self) -> Optional[AgentRun]:
+        """Take the next run this worker may execute, or None when there is none."""
+        running = aliased(AgentRun)
+        earlier = aliased(AgentRun)
+        candidate = (
+            select(AgentRun.id)
+            .where(
+                AgentRun.status == RunStatus.QUEUED,
+                ~exists().where(running.project_id == AgentRun.project_id, running.status == RunStatus.RUNNING),
+                ~exists().where(
+                    earlier.project_id == AgentRun.project_id,
+                    earlier.status == RunStatus.QUEUED,
+                    earlier.created_at < AgentRun.created_at,
+                ),
+            )
+            .order_by(AgentRun.created_at)
+            .limit(1)
+            .with_for_update(of=AgentRun, skip_locked=True)
+            .scalar_subquery()
+        )
+        now = utcnow()
+        stmt = (
+            update(AgentRun)
+            .where(AgentRun.id == candidate)
+            .values(
+                status=RunStatus.RUNNING,
+                worker_id=self.worker_id,
+                attempts=AgentRun.attempts + 1,
+                started_at=now,
+                heartbeat_at=now,
+            )
+            .returning(AgentRun)
+        )
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(stmt)
+            run = result.scalar_one_or_none()
+            await db.commit()
+            return run
+
+    async def execute(self, log: RunEventLog, message: str, retry: bool = False) -> bool:
+        """Run the workflow, appending its events to the log. Returns whether it succeeded.
+
+        ``retry`` marks a later attempt of an interrupted run.
+        """
+        # Imported here so processes that only accept runs never load the agent stack.
+        from app.services.workflow_service import WorkflowService
+
+        prompted_at = utcnow()
+        try:
+            # Loaded in a session of its own: holding one across the run would pin a connection for minutes.
+            async with AsyncSessionLocal() as db:
+                project = await db.get(Project, log.project_id)
+            async with aclosing(WorkflowService().execute_workflow(project, message, retry=retry)) as events:
+                async for event in events:
+                    log.append(event)
+                    log.check_backlog()
+            return True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception("Workflow run %s failed", log.run_id)
+            log.append(create_event(ActionType.ERROR, "Error: " + str(e)))
+            await history_writer.submit(HistoryRecord(
+                project_id=log.project_id,
+                prompt=message,
+                result="Error: " + str(e),
+                result_type=MessageType.ERROR,
+                prompted_at=prompted_at,
+            ))
+            return False
+        finally:
+            self.store.close(log)
+
+    async def _work(self) -> None:
+        while True:
+            try:
+                run = await self.claim()
+            except Exception:
+                logger.exception("Failed to claim an agent run")
+                run = None
+            if run is None:
+                await self._wait()
+                continue
+            # There may be more work; let an idle worker look.
+            self._wakeup.set()
+            await self._process(run)
+
+    async def _process(self, run: AgentRun) -> None:
+        try:
+            async with project_locks.running(run.project_id) as acquired:
+                if not acquired:
+                    # An earlier run of the project is still going, e.g. on a worker presumed dead.
+                    await self._finish(run.id, RunStatus.QUEUED, holds_lock=False)
+                    await asyncio.sleep(self.poll_interval)
+                    return
+                if not await self._still_claimed(run.id):
+                    # Finished by the worker that held the lock before us.
+                    return
+                # Only runs whose lock this worker holds are heartbeated, see _heartbeat.
+                self._active[run.id] = run.project_id
+                await self._execute_claimed(run)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Failed to process agent run %s", run.id)
+        finally:
+            self._active.pop(run.id, None)
+
+    async def _still_claimed(self, run_id: uuid.UUID) -> bool:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(AgentRun.id).where(
+                    AgentRun.id == run_id, AgentRun.status == RunStatus.RUNNING, AgentRun.worker_id == self.worker_id
+                )
+            )
+            return result.first() is not None
+
+    async def _execute_claimed(self, run: AgentRun) -> None:
+        # A retried run continues the event sequence of its previous attempt.
+        start_after = await self.store.last_seq(run.id) if run.attempts > 1 else 0
+        log = self.store.create(run.project_id, run.id, start_after=start_after)
+        await sandbox_leases.acquire(run.project_id, run.id, self.worker_id)
+        try:
+            succeeded = await self.execute(log, run.message, retry=run.attempts > 1)
+        except asyncio.CancelledError:
+            await self.store.flush()
+            await self._finish(run.id, RunStatus.QUEUED)
+            await sandbox_leases.release(run.project_id, self.worker_id, RunStatus.QUEUED)
+            raise
+        # Shielded so that a shutdown cannot leave a completed run marked as running.
+        await asyncio.shield(self._complete(run, succeeded))
+
+    async def _complete(self, run: AgentRun, succeeded: bool) -> None:
+        status = RunStatus.SUCCEEDED if succeeded else RunStatus.FAILED
+        # Events first, so that anyone following the run from the database sees all of them.
+        await self.store.flush()
+        await self._finish(run.id, status)
+        await sandbox_leases.release(run.project_id, self.worker_id, status)
+
+    async def _finish(self, run_id: uuid.UUID, status: RunStatus, holds_lock: bool = True) -> None:
+        """Record how the run ended, or put it back in the queue.
+
+        The worker holding the project's run lock is the one executing the
+        run, even if the heartbeat has since requeued the run or another
+        worker claimed it, so its update applies until the run is finished.
+        A worker that did not get the lock only undoes its own claim.
+        """
+        values = {"status": status}
+        if status == RunStatus.QUEUED:
+            values["worker_id"] = None
+        else:
+            values["worker_id"] = self.worker_id
+            values["finished_at"] = utcnow()
+        stmt = update(AgentRun).where(AgentRun.id == run_id)
+        if holds_lock:
+            stmt = stmt.where(AgentRun.status.in_([RunStatus.QUEUED, RunStatus.RUNNING]))
+        else:
+            stmt = stmt.where(AgentRun.status == RunStatus.RUNNING, AgentRun.worker_id == self.worker_id)
+            # The attempt never started, so it does not count towards max_attempts.
+            values["attempts"] = AgentRun.attempts - 1
+        async with AsyncSessionLocal() as db:
+            await db.execute(stmt.values(**values))
+            await db.commit()
+
+    async def _wait(self) -> None:
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def heartbeat(self) -> None:
+        """Heartbeat this worker's runs and recover the runs of unresponsive workers."""
+        now = utcnow()
+        stale = and_(AgentRun.status == RunStatus.RUNNING, AgentRun.heartbeat_at < now - timedelta(seconds=self.stale_after))
+        async with AsyncSessionLocal() as db:
+            if self._active:
+                # Holding the project lock makes this worker the run's executor; if it
+                # stalled long enough to be requeued, it takes the run back.
+                await db.execute(
+                    update(AgentRun)
+                    .where(AgentRun.id.in_(list(self._active)), AgentRun.status.in_([RunStatus.QUEUED, RunStatus.RUNNING]))
+                    .values(heartbeat_at=now, status=RunStatus.RUNNING, worker_id=self.worker_id)
+                )
+            # A run that took its worker down this often would keep doing so.
+            failed = (await db.execute(
+                update(AgentRun)
+                .where(stale, AgentRun.attempts >= self.max_attempts)
+                .values(status=RunStatus.FAILED, worker_id=None, finished_at=now)
+                .returning(AgentRun.id, AgentRun.project_id, AgentRun.message, AgentRun.attempts)
+            )).all()
+            # Runs of workers that died mid-run are retried elsewhere.
+            requeued = await db.execute(update(AgentRun).where(stale).values(status=RunStatus.QUEUED, worker_id=None))
+            await db.commit()
+        for run_id, project_id, message, attempts in failed:
+            logger.error("Agent run %s failed: its worker stopped responding on all %d attempts", run_id, attempts)
+            await self._record_abandoned(run_id, project_id, message, attempts)
+        await sandbox_leases.renew(self.worker_id, self._active.values())
+        reclaimed = await sandbox_leases.reclaim_expired()
+        if requeued.rowcount:
+            logger.warning("Requeued %d agent runs of unresponsive workers", requeued.rowcount)
+            self._wakeup.set()
+        if reclaimed:
+            logger.warning("Reclaimed %d sandbox leases of unresponsive workers", reclaimed)
+
+    async def _record_abandoned(self, run_id: uuid.UUID, project_id: uuid.UUID, message: str, attempts: int) -> None:
+        error = f"Error: the run was interrupted {attempts} times and has been given up."
+        seq = await self.store.last_seq(run_id) + 1
+        async with AsyncSessionLocal() as db:
+            db.add(WorkflowEvent(run_id=run_id, seq=seq, project_id=project_id, payload=create_event(ActionType.ERROR, error)))
+            await db.commit()
+        await history_writer.submit(HistoryRecord(
+            project_id=project_id,
+            prompt=message,
+            result=error,
+            result_type=MessageType.ERROR,
+            prompted_at=utcnow(),
+        ))
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self.heartbeat()
+            except Exception:
+                logger.exception("Agent run heartbeat failed")
+
+
+run_manager = RunManager()
@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Optional
+
+from app.core.config import settings
+from app.services.sandbox_pool import sandbox_pool
+from app.services.sandbox_service import SandboxConnectionError, SandboxService
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(eq=False)
+class _CachedSandbox:
+    sandbox: Any
+    refs: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+    last_verified: float = field(default_factory=time.monotonic)
+
+
+class SandboxConnectionCache:
+    """Process-wide LRU of live sandbox handles keyed by sandbox_id.
+
+    Handles are shared between the file-browsing endpoints and running
+    workflows. Entries in use are never evicted; idle entries are dropped
+    after ``idle_timeout`` seconds or when the cache grows past ``max_size``.
+    Entries unused for ``revalidate_after`` seconds get a health check before
+    being handed out again, and are reconnected if the check fails.
+    """
+
+    def __init__(
+        self,
+        max_size: int = settings.SANDBOX_CACHE_MAX_SIZE,
+        idle_timeout: int = settings.SANDBOX_CACHE_IDLE_TIMEOUT,
+        revalidate_after: int = settings.SANDBOX_CACHE_REVALIDATE_AFTER,
+    ) -> None:
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.revalidate_after = revalidate_after
+        self._entries: "OrderedDict[str, _CachedSandbox]" = OrderedDict()
+        self._connecting: dict[str, list] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def start(self) -> None:
+        """Start evicting idle handles in the background."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._sweep())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._entries.clear()
+
+    def put(self, sandbox: Any) -> None:
+        """Register a handle that was obtained elsewhere, e.g. leased from the pool."""
+        if sandbox.sandbox_id not in self._entries:
+            self._entries[sandbox.sandbox_id] = _CachedSandbox(sandbox)
+            self._evict()
+
+    def in_use(self, sandbox_id: str) -> bool:
+        entry = self._entries.get(sandbox_id)
+        return entry is not None and entry.refs > 0
+
+    def invalidate(self, sandbox_id: str) -> None:
+        """Drop the cached handle so the next lease reconnects."""
+        self._entries.pop(sandbox_id, None)
+
+    @asynccontextmanager
+    async def lease(self, sandbox_id: str) -> AsyncIterator[SandboxService]:
+        """Borrow a connected SandboxService for the duration of the block.
+
+        Raises SandboxConnectionError when the sandbox cannot be reached.
+        The cached handle is dropped when the block fails with a connection
+        error; any other error leaves it in place.
+        """
+        entry = await self._acquire(sandbox_id)
+        try:
+            yield SandboxService(entry.sandbox)
+        except Exception as e:
+            if self._is_connection_error(e) and self._entries.get(sandbox_id) is entry:
+                self.invalidate(sandbox_id)
+            raise
+        finally:
+            entry.refs -= 1
+            entry.last_used = time.monotonic()
+
+    @staticmethod
+    def _is_connection_error(error: Exception) -> bool:
+        return isinstance(error, SandboxConnectionError) or sandbox_pool.backend.is_connection_error(error)
+
+    async def _acquire(self, sandbox_id: str) -> _CachedSandbox:
+        entry = self._entries.get(sandbox_id)
+        if entry:
+            # Referenced while the health check awaits, so the sweep and _evict leave it alone.
+            entry.refs += 1
+            try:
+                fresh = await self._is_fresh(entry)
+            except BaseException:
+                entry.refs -= 1
+                raise
+            if fresh and self._entries.get(sandbox_id) is entry:
+                return self._touch(sandbox_id, entry)
+            entry.refs -= 1
+            if self._entries.get(sandbox_id) is entry:
+                self.invalidate(sandbox_id)
+        # Lock and number of tasks using it, so the lock is dropped only when nobody waits on it.
+        connecting = self._connecting.setdefault(sandbox_id, [asyncio.Lock(), 0])
+        connecting[1] += 1
+        try:
+            async with connecting[0]:
+                entry = self._entries.get(sandbox_id)
+                if entry is None:
+                    entry = _CachedSandbox(await self._connect(sandbox_id))
+                    self._entries[sandbox_id] = entry
+                entry.refs += 1
+        finally:
+            connecting[1] -= 1
+            if not connecting[1]:
+                self._connecting.pop(sandbox_id, None)
+        return self._touch(sandbox_id, entry)
+
+    def _touch(self, sandbox_id: str, entry: _CachedSandbox) -> _CachedSandbox:
+        entry.last_used = time.monotonic()
+        self._entries.move_to_end(sandbox_id)
+        self._evict()
+        return entry
+
+    async def _is_fresh(self, entry: _CachedSandbox) -> bool:
+        now = time.monotonic()
+        if now - entry.last_verified < self.revalidate_after:
+            return True
+        if not await sandbox_pool.backend.is_healthy(entry.sandbox):
+            return False
+        entry.last_verified = now
+        return True
+
+    async def _connect(self, sandbox_id: str) -> Any:
+        """Connect once more after a failure before giving up; connect errors are often transient."""
+        try:
+            return await sandbox_pool.backend.connect(sandbox_id)
+        except Exception:
+            logger.info("Retrying connection to sandbox %s", sandbox_id)
+        try:
+            return await sandbox_pool.backend.connect(sandbox_id)
+        except Exception as e:
+            raise SandboxConnectionError(f"Could not connect to sandbox {sandbox_id}: {e}") from e
+
+    def _evict(self) -> None:
+        """Drop least recently used idle handles until the cache fits in max_size."""
+        excess = len(self._entries) - self.max_size
+        if excess <= 0:
+            return
+        for sandbox_id, entry in list(self._entries.items()):
+            if excess <= 0:
+                break
+            if entry.refs == 0:
+                del self._entries[sandbox_id]
+                excess -= 1
+
+    async def _sweep(self) -> None:
+        while True:
+            await asyncio.sleep(max(1, self.idle_timeout // 4))
+            cutoff = time.monotonic() - self.idle_timeout
+            for sandbox_id, entry in list(self._entries.items()):
+                if entry.refs == 0 and entry.last_used < cutoff:
+                    del self._entries[sandbox_id]
+
+
+sandbox_cache = SandboxConnectionCache()
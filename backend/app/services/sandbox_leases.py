@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.utils import utcnow
+from app.models.database import RunStatus, SandboxLease
+
+logger = logging.getLogger(__name__)
+
+
+class SandboxLeaseRegistry:
+    """Shared record of which worker holds each project's sandbox and run.
+
+    A worker takes the lease of a project while it holds the project's run
+    lock (a Postgres advisory lock, see ``project_locks.running``), so the
+    lock decides who owns the project and the lease row tells every other
+    worker about it. Owners renew their leases with the run heartbeat;
+    leases that expire belong to crashed workers and are reclaimed, and the
+    lock of a crashed worker went away with its connection.
+
+    Activity on a sandbox is collected in memory and written in batches
+    every ``flush_interval`` seconds, so the idle sweep of any worker sees
+    file browsing served by all of them.
+    """
+
+    def __init__(
+        self,
+        ttl: int = settings.RUN_STALE_AFTER,
+        flush_interval: float = settings.SANDBOX_ACTIVITY_FLUSH_INTERVAL,
+    ) -> None:
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self._touched: set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_periodically())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.warning("Failed to record sandbox activity", exc_info=True)
+
+    async def get(self, project_id: uuid.UUID, db: Optional[AsyncSession] = None) -> Optional[SandboxLease]:
+        if db is not None:
+            return await db.get(SandboxLease, project_id)
+        async with AsyncSessionLocal() as db:
+            return await db.get(SandboxLease, project_id)
+
+    async def acquire(self, project_id: uuid.UUID, run_id: uuid.UUID, owner: str) -> None:
+        """Record ``owner`` as running ``run_id``. The caller must hold the project's run lock."""
+        now = utcnow()
+        values = {
+            "owner": owner,
+            "lease_expires_at": now + timedelta(seconds=self.ttl),
+            "run_id": run_id,
+            "run_status": RunStatus.RUNNING,
+            "last_active_at": now,
+        }
+        async with AsyncSessionLocal() as db:
+            previous = (await db.execute(select(SandboxLease.owner).where(SandboxLease.project_id == project_id))).scalar()
+            if previous and previous != owner:
+                logger.warning("Taking over the lease of project %s from %s", project_id, previous)
+            dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+            stmt = dialect.insert(SandboxLease).values(project_id=project_id, **values)
+            stmt = stmt.on_conflict_do_update(index_elements=["project_id"], set_=values)
+            await db.execute(stmt)
+            await db.commit()
+
+    async def attach_sandbox(self, project_id: uuid.UUID, sandbox_id: str) -> None:
+        """Record the sandbox the project's run is using."""
+        await self._update(
+            update(SandboxLease)
+            .where(SandboxLease.project_id == project_id)
+            .values(sandbox_id=sandbox_id, last_active_at=utcnow(), paused_at=None)
+        )
+
+    async def release(self, project_id: uuid.UUID, owner: str, status: RunStatus) -> None:
+        """Give up the lease, recording how the run ended.
+
+        Also applies if the lease was reclaimed while the owner stalled: it
+        still holds the run lock, so nobody else can have taken the lease.
+        """
+        await self._update(
+            update(SandboxLease)
+            .where(SandboxLease.project_id == project_id, or_(SandboxLease.owner == owner, SandboxLease.owner.is_(None)))
+            .values(owner=None, lease_expires_at=None, run_status=status, last_active_at=utcnow())
+        )
+
+    async def renew(self, owner: str, project_ids: Iterable[uuid.UUID]) -> None:
+        project_ids = list(project_ids)
+        if not project_ids:
+            return
+        await self._update(
+            update(SandboxLease)
+            .where(SandboxLease.project_id.in_(project_ids), SandboxLease.owner == owner)
+            .values(lease_expires_at=utcnow() + timedelta(seconds=self.ttl))
+        )
+
+    async def reclaim_expired(self) -> int:
+        """Free the leases of workers that stopped renewing them. Returns how many were reclaimed."""
+        # Their runs are requeued by the same heartbeat, hence QUEUED.
+        return await self._update(
+            update(SandboxLease)
+            .where(SandboxLease.owner.is_not(None), SandboxLease.lease_expires_at < utcnow())
+            .values(owner=None, lease_expires_at=None, run_status=RunStatus.QUEUED)
+        )
+
+    def touch(self, sandbox_id: str) -> None:
+        """Note activity on a sandbox; written by the next ``flush``."""
+        self._touched.add(sandbox_id)
+
+    async def flush(self) -> None:
+        """Write the activity noted since the last flush in one statement."""
+        touched, self._touched = self._touched, set()
+        if not touched:
+            return
+        try:
+            # Connecting resumes a paused sandbox.
+            await self._update(
+                update(SandboxLease)
+                .where(SandboxLease.sandbox_id.in_(touched))
+                .values(last_active_at=utcnow(), paused_at=None)
+            )
+        except Exception:
+            self._touched |= touched
+            raise
+
+    async def idle(self, before: datetime, limit: int = 100) -> list[SandboxLease]:
+        """Unowned, running sandboxes last used before ``before``, longest idle first."""
+        return await self._select(
+            select(SandboxLease)
+            .where(
+                SandboxLease.owner.is_(None),
+                SandboxLease.sandbox_id.is_not(None),
+                SandboxLease.paused_at.is_(None),
+                SandboxLease.last_active_at < before,
+            )
+            .order_by(SandboxLease.last_active_at)
+            .limit(limit)
+        )
+
+    async def paused(self, before: datetime, limit: int = 100) -> list[SandboxLease]:
+        """Unowned sandboxes paused before ``before``."""
+        return await self._select(
+            select(SandboxLease)
+            .where(
+                SandboxLease.owner.is_(None),
+                SandboxLease.sandbox_id.is_not(None),
+                SandboxLease.paused_at < before,
+            )
+            .order_by(SandboxLease.paused_at)
+            .limit(limit)
+        )
+
+    async def mark_paused(self, project_id: uuid.UUID, sandbox_id: str, idle_before: datetime) -> bool:
+        """Mark the sandbox paused if it is still unowned and idle. Returns whether it was."""
+        return bool(await self._update(
+            update(SandboxLease)
+            .where(
+                SandboxLease.project_id == project_id,
+                SandboxLease.sandbox_id == sandbox_id,
+                SandboxLease.owner.is_(None),
+                SandboxLease.paused_at.is_(None),
+                SandboxLease.last_active_at < idle_before,
+            )
+            .values(paused_at=utcnow())
+        ))
+
+    async def mark_killed(self, project_id: uuid.UUID, sandbox_id: str, idle_before: datetime) -> bool:
+        """Forget the sandbox if it is still unowned and idle. Returns whether it was."""
+        return bool(await self._update(
+            update(SandboxLease)
+            .where(
+                SandboxLease.project_id == project_id,
+                SandboxLease.sandbox_id == sandbox_id,
+                SandboxLease.owner.is_(None),
+                SandboxLease.last_active_at < idle_before,
+            )
+            .values(sandbox_id=None, paused_at=None)
+        ))
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to record sandbox activity")
+
+    async def _select(self, stmt) -> list[SandboxLease]:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(stmt)
+            return list(result.scalars().all())
+
+    async def _update(self, stmt) -> int:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(stmt)
+            await db.commit()
+            return result.rowcount
+
+
+sandbox_leases = SandboxLeaseRegistry()
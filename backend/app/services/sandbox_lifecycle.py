@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.utils import utcnow
+from app.models.database import Fragment, Message, SandboxLease
+from app.services.blob_store import blob_store
+from app.services.error_checker import error_checker
+from app.services.file_cache import SANDBOX_HOME, normalize_path
+from app.services.project_lock import project_locks
+from app.services.sandbox_cache import sandbox_cache
+from app.services.sandbox_leases import sandbox_leases
+from app.services.sandbox_pool import sandbox_pool
+from app.services.sandbox_service import INSTALL_COMMAND, SandboxFile, SandboxService
+
+logger = logging.getLogger(__name__)
+
+PACKAGE_JSON = f"{SANDBOX_HOME}/package.json"
+
+
+class SandboxLifecycleManager:
+    """Pauses or kills project sandboxes nobody has used for a while.
+
+    Every sandbox handed to a run or a file-browsing request is ``touch``-ed.
+    Sandboxes idle for ``idle_timeout`` seconds are paused (resumed by the
+    next connect) or killed, depending on ``idle_action``; paused sandboxes
+    are killed after ``paused_ttl`` seconds. A project whose sandbox is gone
+    gets its generated files back with ``rehydrate``.
+
+    Activity and pause state live in the shared lease registry, so every
+    worker sweeps all sandboxes. A sandbox is only paused or killed while
+    the sweeping worker holds its project's run lock and the project has
+    no lease owner, so two workers never act on one sandbox and never on
+    one a run is using.
+    """
+
+    def __init__(
+        self,
+        idle_timeout: int = settings.SANDBOX_IDLE_TIMEOUT,
+        idle_action: str = settings.SANDBOX_IDLE_ACTION,
+        paused_ttl: int = settings.SANDBOX_PAUSED_TTL,
+        install_timeout: int = settings.SANDBOX_INSTALL_TIMEOUT,
+    ) -> None:
+        self.idle_timeout = idle_timeout
+        self.idle_action = idle_action
+        self.paused_ttl = paused_ttl
+        self.install_timeout = install_timeout
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is None and self.idle_timeout > 0:
+            self._task = asyncio.create_task(self._sweep_periodically())
+
+    async def stop(self) -> None:
+        """Stop sweeping. Sandboxes are left as they are; E2B's own timeout still applies."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def touch(self, sandbox: Any) -> None:
+        """Record activity on a connected sandbox."""
+        sandbox_leases.touch(sandbox.sandbox_id)
+
+    async def rehydrate(self, project_id: uuid.UUID, service: SandboxService) -> list[str]:
+        """Upload the files of the project's latest fragment into its new sandbox in one batch.
+
+        Returns the normalized paths of the files restored. When they include
+        ``PACKAGE_JSON``, follow up with ``install_dependencies``.
+        """
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Fragment.files)
+                .join(Message, Fragment.message_id == Message.id)
+                .where(Message.project_id == project_id)
+                .order_by(Message.created_at.desc(), Message.id.desc())
+                .limit(1)
+            )
+            manifest = result.scalar_one_or_none()
+        if not manifest:
+            return []
+        files = await blob_store.materialize_files(manifest)
+        if len(files) < len(manifest):
+            logger.warning("%d files of project %s are missing from the blob store", len(manifest) - len(files), project_id)
+        results = await service.create_or_update_files([SandboxFile(path=path, content=content) for path, content in files.items()])
+        failed = [result.path for result in results if result.error]
+        if failed:
+            logger.warning("Could not restore %d files of project %s: %s", len(failed), project_id, ", ".join(failed))
+        return [normalize_path(result.path) for result in results if not result.error]
+
+    async def install_dependencies(self, project_id: uuid.UUID, service: SandboxService) -> None:
+        """Install the restored package.json's dependencies and restart the dev server, so the preview works as before."""
+        output = await service.run_command(INSTALL_COMMAND, timeout=self.install_timeout)
+        if output.startswith("Command execution failed"):
+            logger.warning("Could not install the dependencies of project %s: %s", project_id, output)
+        try:
+            await service.restart_dev_server()
+        except Exception:
+            logger.warning("Could not restart the dev server of project %s", project_id, exc_info=True)
+
+    async def sweep(self) -> None:
+        await sandbox_leases.flush()
+        now = utcnow()
+        idle_before = now - timedelta(seconds=self.idle_timeout)
+        for lease in await sandbox_leases.idle(idle_before):
+            await self._retire(lease, self.idle_action, idle_before)
+        if self.paused_ttl > 0:
+            paused_before = now - timedelta(seconds=self.paused_ttl)
+            for lease in await sandbox_leases.paused(paused_before):
+                await self._retire(lease, "kill", paused_before)
+
+    async def _retire(self, lease: SandboxLease, action: str, idle_before: datetime) -> None:
+        sandbox_id = lease.sandbox_id
+        if sandbox_cache.in_use(sandbox_id):
+            sandbox_leases.touch(sandbox_id)
+            return
+        async with project_locks.running(lease.project_id) as acquired:
+            if not acquired:
+                # A run of the project is starting or going on here or on another worker.
+                return
+            # Dropped first so nobody here is handed the handle while it is being paused.
+            sandbox_cache.invalidate(sandbox_id)
+            if action == "pause":
+                if not await sandbox_leases.mark_paused(lease.project_id, sandbox_id, idle_before):
+                    return
+                try:
+                    await sandbox_pool.backend.pause(sandbox_id)
+                    return
+                except Exception:
+                    logger.warning("Failed to pause sandbox %s, killing it instead", sandbox_id, exc_info=True)
+            if not await sandbox_leases.mark_killed(lease.project_id, sandbox_id, idle_before):
+                return
+            error_checker.forget(sandbox_id)
+            try:
+                await sandbox_pool.backend.kill_by_id(sandbox_id)
+            except Exception:
+                logger.warning("Failed to kill sandbox %s", sandbox_id, exc_info=True)
+
+    async def _sweep_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(max(1, self.idle_timeout // 4))
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Sandbox lifecycle sweep failed")
+
+
+sandbox_lifecycle = SandboxLifecycleManager()
@@ -0,0 +1,253 @@
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Optional
+
+from app.core.config import settings
+
+if TYPE_CHECKING:
+    from e2b import AsyncSandbox
+
+logger = logging.getLogger(__name__)
+
+# Any HTTP response counts; the request also makes Next.js compile the first page.
+DEV_SERVER_CHECK_COMMAND = "curl -s -o /dev/null --max-time 20 http://localhost:3000"
+
+
+class SandboxBackend(ABC):
+    """Creates and manages sandboxes. Swap it out to run against a local fake sandbox."""
+
+    @abstractmethod
+    async def create(self, template: str) -> Any:
+        ...
+
+    @abstractmethod
+    async def connect(self, sandbox_id: str) -> Any:
+        ...
+
+    @abstractmethod
+    async def is_healthy(self, sandbox: Any) -> bool:
+        """Whether the sandbox is running and its dev server answers."""
+
+    @abstractmethod
+    async def pause(self, sandbox_id: str) -> None:
+        """Suspend the sandbox; connecting to it again resumes it."""
+
+    @abstractmethod
+    async def kill(self, sandbox: Any) -> None:
+        ...
+
+    @abstractmethod
+    async def kill_by_id(self, sandbox_id: str) -> None:
+        """Kill a sandbox without connecting to it, which would resume a paused one."""
+
+    def is_connection_error(self, error: Exception) -> bool:
+        """Whether ``error`` means the handle to the sandbox is no longer usable."""
+        return False
+
+
+class E2BSandboxBackend(SandboxBackend):
+    """Backend for E2B cloud sandboxes."""
+
+    def __init__(self, timeout: int = settings.SANDBOX_TIMEOUT) -> None:
+        self.timeout = timeout
+
+    async def create(self, template: str) -> "AsyncSandbox":
+        # e2b is imported on first use; API processes that never touch a sandbox don't pay for it.
+        from e2b import AsyncSandbox
+
+        return await AsyncSandbox.create(template, timeout=self.timeout)
+
+    async def connect(self, sandbox_id: str) -> "AsyncSandbox":
+        from e2b import AsyncSandbox
+
+        return await AsyncSandbox.connect(sandbox_id)
+
+    async def is_healthy(self, sandbox: "AsyncSandbox") -> bool:
+        try:
+            if not await sandbox.is_running():
+                return False
+            # Raises when curl gets no response.
+            await sandbox.commands.run(DEV_SERVER_CHECK_COMMAND)
+            return True
+        except Exception:
+            return False
+
+    async def pause(self, sandbox_id: str) -> None:
+        from e2b import AsyncSandbox
+
+        await AsyncSandbox.pause(sandbox_id)
+
+    async def kill(self, sandbox: "AsyncSandbox") -> None:
+        await sandbox.kill()
+
+    async def kill_by_id(self, sandbox_id: str) -> None:
+        from e2b import AsyncSandbox
+
+        await AsyncSandbox.kill(sandbox_id)
+
+    def is_connection_error(self, error: Exception) -> bool:
+        # Only the sandbox itself going missing; e.g. FileNotFoundException is a NotFoundException too.
+        from e2b import SandboxNotFoundException, TimeoutException
+
+        return isinstance(error, (SandboxNotFoundException, TimeoutException))
+
+
+@dataclass(eq=False)
+class _PooledSandbox:
+    sandbox: Any
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class SandboxPool:
+    """Keeps warm sandboxes ready so new projects don't wait for a cold boot.
+
+    The pool holds at least ``min_size`` idle sandboxes and grows towards
+    ``max_size`` while leases keep coming in. A new sandbox joins the pool
+    once its dev server answers, so a lease never waits for the boot; one
+    that is not up within ``boot_timeout`` seconds is killed. Idle sandboxes
+    older than ``max_age`` seconds or failing a health check are killed and
+    replaced.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[SandboxBackend] = None,
+        template: str = settings.SANDBOX_TEMPLATE,
+        min_size: int = settings.SANDBOX_POOL_MIN_SIZE,
+        max_size: int = settings.SANDBOX_POOL_MAX_SIZE,
+        max_age: int = settings.SANDBOX_POOL_MAX_AGE,
+        health_check_interval: int = settings.SANDBOX_POOL_HEALTH_CHECK_INTERVAL,
+        boot_timeout: int = settings.SANDBOX_POOL_BOOT_TIMEOUT,
+    ) -> None:
+        self.backend = backend or E2BSandboxBackend()
+        self.template = template
+        self.min_size = min_size
+        self.max_size = max(max_size, min_size)
+        self.max_age = max_age
+        self.health_check_interval = health_check_interval
+        self.boot_timeout = boot_timeout
+        self._idle: deque[_PooledSandbox] = deque()
+        self._creating = 0
+        self._recent_leases: deque[float] = deque()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._background: set[asyncio.Task] = set()
+
+    @property
+    def size(self) -> int:
+        return len(self._idle)
+
+    async def start(self) -> None:
+        """Start replenishing the pool in the background."""
+        if self._task is None and self.max_size > 0:
+            self._task = asyncio.create_task(self._maintain())
+
+    async def stop(self) -> None:
+        """Stop the background task and kill all idle sandboxes."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        idle = [pooled.sandbox for pooled in self._idle]
+        self._idle.clear()
+        await asyncio.gather(*(self._kill(sandbox) for sandbox in idle))
+        await asyncio.gather(*self._background, return_exceptions=True)
+
+    async def lease(self) -> Any:
+        """Take a warm sandbox out of the pool, or create one if the pool is empty."""
+        self._recent_leases.append(time.monotonic())
+        self._wakeup.set()
+        while self._idle:
+            pooled = self._idle.popleft()
+            if self._is_expired(pooled):
+                self._spawn(self._kill(pooled.sandbox))
+                continue
+            return pooled.sandbox
+        return await self.backend.create(self.template)
+
+    def _is_expired(self, pooled: _PooledSandbox) -> bool:
+        return time.monotonic() - pooled.created_at > self.max_age
+
+    def _target_size(self) -> int:
+        """Grow past min_size by the number of leases seen in the last interval."""
+        cutoff = time.monotonic() - self.health_check_interval
+        while self._recent_leases and self._recent_leases[0] < cutoff:
+            self._recent_leases.popleft()
+        return min(self.max_size, self.min_size + len(self._recent_leases))
+
+    async def _maintain(self) -> None:
+        last_health_check = time.monotonic()
+        while True:
+            self._wakeup.clear()
+            try:
+                if time.monotonic() - last_health_check >= self.health_check_interval:
+                    await self._check_health()
+                    last_health_check = time.monotonic()
+                await self._replenish()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Sandbox pool maintenance failed")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.health_check_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _check_health(self) -> None:
+        pooled = list(self._idle)
+        healthy = await asyncio.gather(*(self.backend.is_healthy(p.sandbox) for p in pooled))
+        for p, ok in zip(pooled, healthy):
+            if (not ok or self._is_expired(p)) and p in self._idle:
+                self._idle.remove(p)
+                self._spawn(self._kill(p.sandbox))
+
+    async def _replenish(self) -> None:
+        missing = self._target_size() - len(self._idle) - self._creating
+        if missing > 0:
+            await asyncio.gather(*(self._create() for _ in range(missing)))
+
+    async def _create(self) -> None:
+        self._creating += 1
+        try:
+            sandbox = await self.backend.create(self.template)
+        except Exception:
+            logger.exception("Failed to create pooled sandbox")
+            self._creating -= 1
+            return
+        try:
+            if await self._wait_until_ready(sandbox):
+                self._idle.append(_PooledSandbox(sandbox))
+            else:
+                logger.warning("Pooled sandbox did not come up within %d s", self.boot_timeout)
+                self._spawn(self._kill(sandbox))
+        except asyncio.CancelledError:
+            self._spawn(self._kill(sandbox))
+            raise
+        finally:
+            self._creating -= 1
+
+    async def _wait_until_ready(self, sandbox: Any) -> bool:
+        deadline = time.monotonic() + self.boot_timeout
+        while not await self.backend.is_healthy(sandbox):
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(1)
+        return True
+
+    async def _kill(self, sandbox: Any) -> None:
+        try:
+            await self.backend.kill(sandbox)
+        except Exception:
+            logger.warning("Failed to kill sandbox", exc_info=True)
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+
+sandbox_pool = SandboxPool()
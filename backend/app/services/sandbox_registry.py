@@ -0,0 +1,36 @@
+from typing import Any, Optional
+
+from app.services.sandbox_service import SandboxService
+
+
+class SandboxNotRegisteredError(LookupError):
+    """Raised when a tool runs for a project that has no run in flight in this process."""
+
+
+class SandboxRegistry:
+    """Maps each project with a run in flight to the SandboxService of that run.
+
+    The agent tree is built once per process, so its tools look up the
+    sandbox of the current invocation here using the project id stored in
+    session state.
+    """
+
+    def __init__(self) -> None:
+        self._sandboxes: dict[str, SandboxService] = {}
+
+    def register(self, project_id: Any, sandbox: SandboxService) -> None:
+        self._sandboxes[str(project_id)] = sandbox
+
+    def unregister(self, project_id: Any, sandbox: Optional[SandboxService] = None) -> None:
+        """Remove the project's entry, unless it has since been replaced by another run."""
+        if sandbox is None or self._sandboxes.get(str(project_id)) is sandbox:
+            self._sandboxes.pop(str(project_id), None)
+
+    def get(self, project_id: Any) -> SandboxService:
+        sandbox = self._sandboxes.get(str(project_id))
+        if sandbox is None:
+            raise SandboxNotRegisteredError(f"No sandbox registered for project {project_id}.")
+        return sandbox
+
+
+sandbox_registry = SandboxRegistry()
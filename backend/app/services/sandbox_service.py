@@ -1,28 +1,56 @@
-from typing import Any, Optional, Union
-from e2b import AsyncSandbox
+import asyncio
+from typing import Any, Callable, Optional, Union
 from pydantic import BaseModel, Field
-from dotenv import load_dotenv
-load_dotenv()
+
+from app.core.config import settings
+from app.core.telemetry import traced_sandbox_call
+from app.services.blob_store import content_hash
+from app.services.error_checker import Diagnostic, ErrorCheckResult, error_checker
+from app.services.file_cache import file_cache
+from app.services.output_buffer import OutputBuffer
+from app.services.sandbox_pool import sandbox_pool
+
+INSTALL_COMMAND = "npm install --yes"
+# The brackets keep pkill from matching the shell running it.
+DEV_SERVER_STOP_COMMAND = "pkill -f '[n]ext dev' || true"
+# The same command the sandbox template starts the server with.
+DEV_SERVER_START_COMMAND = "npm run dev -- --turbopack"
+
 class SandboxFile(BaseModel):
     path: str = Field(..., description="The file path in the sandbox.")
     content: str = Field(..., description="The content of the file.")
 
+class FileWriteResult(SandboxFile):
+    error: Optional[str] = Field(None, description="Why the write failed, if it did.")
+
+class FileEdit(BaseModel):
+    search: str = Field(..., description="Exact text to replace. Must occur exactly once in the file; include enough surrounding lines to make it unique.")
+    replace: str = Field(..., description="Text to put in its place.")
+
+class FileEditResult(FileWriteResult):
+    conflicts: list[str] = Field(default_factory=list, description="Why the edits could not be applied; nothing is written when there are any.")
+
+class SandboxConnectionError(Exception):
+    """Raised when an existing sandbox can no longer be reached."""
+
 class SandboxService:
 
-    def __init__(self):
-        self.sandbox = None
+    def __init__(self, sandbox: Any = None):
+        self.sandbox = sandbox
+        # Called with (stream, data) for every chunk of command output, e.g. to stream it to the client.
+        self.output_listener: Optional[Callable[[str, str], None]] = None
 
+    @traced_sandbox_call
     async def connect(self, sandbox_id: Optional[str] = None) -> str:
+        """Connect to an existing sandbox, or lease a new one when no id is given."""
+        if not sandbox_id:
+            self.sandbox = await sandbox_pool.lease()
+            return self.sandbox.sandbox_id
         try:
-            if sandbox_id:
-                self.sandbox = await AsyncSandbox.connect(sandbox_id)
-                return self.sandbox.sandbox_id
-            else:
-                self.sandbox = await AsyncSandbox.create('agentX-test')
-                return self.sandbox.sandbox_id
-        except Exception as e:
-            self.sandbox = await AsyncSandbox.create('agentX-test')
+            self.sandbox = await sandbox_pool.backend.connect(sandbox_id)
             return self.sandbox.sandbox_id
+        except Exception as e:
+            raise SandboxConnectionError(f"Could not connect to sandbox {sandbox_id}: {e}") from e
     
     def _get_sandbox(self):
         if not self.sandbox:
@@ -36,70 +64,136 @@ class SandboxService:
         except Exception as e:
             return str(e)
     
-    async def run_command(self, command: str) -> str:
-        """Terminal command execution."""
+    @traced_sandbox_call
+    async def restart_dev_server(self) -> None:
+        """Restart the Next.js dev server, e.g. so it picks up newly installed dependencies."""
+        sandbox = self._get_sandbox()
+        await sandbox.commands.run(DEV_SERVER_STOP_COMMAND)
+        await sandbox.commands.run(DEV_SERVER_START_COMMAND, background=True)
+
+    @traced_sandbox_call
+    async def run_command(self, command: str, timeout: Optional[float] = None) -> str:
+        """Terminal command execution. ``timeout`` overrides the sandbox's default command timeout, in seconds."""
+        stdout = OutputBuffer()
+        stderr = OutputBuffer()
+        options = {} if timeout is None else {"timeout": timeout}
         try:
-            buffer = {
-                "stdout": "",
-                "stderr": ""
-            }
-            result = await self._get_sandbox().commands.run(
+            await self._get_sandbox().commands.run(
                 command, 
-                on_stdout=lambda data: buffer.update({"stdout": buffer["stdout"] + data}),
-                on_stderr=lambda data: buffer.update({"stderr": buffer["stderr"] + data})
+                on_stdout=lambda data: self._capture(stdout, "stdout", data),
+                on_stderr=lambda data: self._capture(stderr, "stderr", data),
+                **options,
                 )
-            return result.stdout
+            return stdout.getvalue()
         except Exception as e:
-            return f"Command execution failed: {str(e)}\nStdout: {buffer['stdout']}\nStderr: {buffer['stderr']}"
+            reason = f"exited with code {e.exit_code}" if hasattr(e, "exit_code") else str(e)
+            return f"Command execution failed: {reason}\nStdout: {stdout.getvalue()}\nStderr: {stderr.getvalue()}"
+        finally:
+            if self.sandbox:
+                file_cache.mark_stale(self.sandbox.sandbox_id)
+
+    def _capture(self, buffer: OutputBuffer, stream: str, data: str) -> None:
+        buffer.write(data)
+        if self.output_listener:
+            self.output_listener(stream, data)
         
-    async def check_for_errors(self) -> Optional[str]:
-        """Check for any errors in the app. Returns error message or None if no errors."""
+    @traced_sandbox_call
+    async def check_for_errors(self) -> ErrorCheckResult:
+        """Check for any errors in the app and return structured diagnostics."""
         try:
-            sandbox = self._get_sandbox()
-
-            process_check = await sandbox.commands.run("lsof -i :3000 | grep LISTEN")
-            if not process_check.stdout.strip():
-                return "App is not running on port 3000"
-            
-            build_check = await sandbox.commands.run("npm run build --dry-run 2>&1 || true")
-            if "error" in build_check.stdout.lower() or build_check.exit_code != 0:
-                return f"Build errors detected: {build_check.stdout}"
-            
-            ts_check = await sandbox.commands.run("npx tsc --noEmit --skipLibCheck 2>&1 || true")
-            if ts_check.exit_code != 0:
-                return f"TypeScript errors: {ts_check.stdout}"
-            
-            return None
-            
+            return await error_checker.check(self._get_sandbox())
         except Exception as e:
-            return f"Error check failed: {str(e)}"
+            return ErrorCheckResult(ok=False, diagnostics=[Diagnostic(source="check", message=f"Error check failed: {str(e)}")])
         
-    async def create_or_update_files(self, files: list[Any]) -> Union[list[SandboxFile], str]:
+    @traced_sandbox_call
+    async def create_or_update_files(self, files: list[Any]) -> list[FileWriteResult]:
+        """Write files in one batched upload, reporting the outcome per file.
+
+        Later writes to the same path replace earlier ones in the batch. If the
+        batched upload fails, files are written individually with bounded
+        concurrency so one bad file does not fail the rest.
+        """
+        pending: dict[str, SandboxFile] = {}
+        for file in files:
+            if isinstance(file, dict):
+                file = SandboxFile(**file)
+            if file.path.startswith("/"):
+                file.path = file.path[1:]
+            pending[file.path] = file
         try:
-            new_files: list[SandboxFile] = []
             sandbox = self._get_sandbox()
-            for file in files:
-                if isinstance(file, dict):
-                    file = SandboxFile(**file)
-                if file.path.startswith("/"):
-                    file.path = file.path[1:]
-                await sandbox.files.write(file.path, file.content)
-                new_files.append(file)
-            return new_files
         except Exception as e:
-            return "File write failed: " + str(e)
+            return [FileWriteResult(**file.model_dump(), error=str(e)) for file in pending.values()]
+        try:
+            await sandbox.files.write_files([{"path": file.path, "data": file.content} for file in pending.values()])
+            results = [FileWriteResult(**file.model_dump()) for file in pending.values()]
+        except Exception:
+            semaphore = asyncio.Semaphore(settings.SANDBOX_WRITE_CONCURRENCY)
+            results = list(await asyncio.gather(*(self._write_file(sandbox, file, semaphore) for file in pending.values())))
+        for result in results:
+            if result.error is None:
+                file_cache.put_written(sandbox.sandbox_id, result.path, result.content)
+            else:
+                file_cache.invalidate(sandbox.sandbox_id, result.path)
+        return results
+
+    async def _write_file(self, sandbox: Any, file: SandboxFile, semaphore: asyncio.Semaphore) -> FileWriteResult:
+        async with semaphore:
+            try:
+                await sandbox.files.write(file.path, file.content)
+                return FileWriteResult(**file.model_dump())
+            except Exception as e:
+                return FileWriteResult(**file.model_dump(), error="File write failed: " + str(e))
         
+    @traced_sandbox_call
+    async def edit_file(self, path: str, edits: list[Any], base_hash: Optional[str] = None) -> FileEditResult:
+        """Apply search/replace edits to the current content of a file and write the result.
+
+        When ``base_hash`` is given, the file must still hash to it (a prefix of
+        at least 8 hex digits is enough). Any conflict leaves the file untouched.
+        """
+        edits = [FileEdit(**edit) if isinstance(edit, dict) else edit for edit in edits]
+        try:
+            current = await self._read_cached(self._get_sandbox(), path)
+        except Exception as e:
+            return FileEditResult(path=path, content="", error="File read failed: " + str(e))
+        if base_hash:
+            actual = content_hash(current)
+            if len(base_hash) < 8 or not actual.startswith(base_hash):
+                return FileEditResult(path=path, content=current, conflicts=[
+                    f"File changed since it was read: expected hash {base_hash}, found {actual[:12]}"
+                ])
+        content, conflicts = apply_edits(current, edits)
+        if conflicts:
+            return FileEditResult(path=path, content=current, conflicts=conflicts)
+        [result] = await self.create_or_update_files([SandboxFile(path=path, content=content)])
+        return FileEditResult(**result.model_dump())
+
+    @traced_sandbox_call
     async def read_files(self, paths: list[str]) -> Union[list[SandboxFile], str]:
+        """Read files concurrently, serving unchanged files from the content cache."""
         try:
-            contents = []
             sandbox = self._get_sandbox()
-            for path in paths:
-                content = await sandbox.files.read(path)
-                contents.append(SandboxFile(path=path, content=content).model_dump())
-            return contents
+            semaphore = asyncio.Semaphore(settings.SANDBOX_READ_CONCURRENCY)
+            contents = await asyncio.gather(*(self._read_cached(sandbox, path, semaphore) for path in paths))
+            return [SandboxFile(path=path, content=content).model_dump() for path, content in zip(paths, contents)]
         except Exception as e:
             return "File read failed: " + str(e)
+
+    async def _read_cached(self, sandbox: Any, path: str, semaphore: Optional[asyncio.Semaphore] = None) -> str:
+        content = file_cache.get_trusted(sandbox.sandbox_id, path)
+        if content is not None:
+            return content
+        async with semaphore or asyncio.Semaphore(1):
+            info = await sandbox.files.get_info(path)
+            version = (info.modified_time.timestamp(), info.size)
+            content = file_cache.get(sandbox.sandbox_id, path, sandbox_pool.template, version)
+            if content is None:
+                content = await sandbox.files.read(path)
+                file_cache.put(sandbox.sandbox_id, path, sandbox_pool.template, version, content)
+            return content
         
+    @traced_sandbox_call
     async def list_files(self, path: str = "/home/user/src/"):
         try:
             files = await self._get_sandbox().files.list(path, depth=5)
@@ -107,9 +201,27 @@ class SandboxService:
         except Exception as e:
             return "File list failed: " + str(e)
     
+    @traced_sandbox_call
     async def read_file(self, path: str):
         try:
-            content = await self._get_sandbox().files.read(path)
+            content = await self._read_cached(self._get_sandbox(), path)
             return content
         except Exception as e:
             return "File read failed: " + str(e)
+
+
+def apply_edits(content: str, edits: list[FileEdit]) -> tuple[str, list[str]]:
+    """Apply the edits in order; each search text must match exactly once at the time it is applied."""
+    conflicts = []
+    for index, edit in enumerate(edits, 1):
+        if not edit.search:
+            conflicts.append(f"Edit {index}: search text is empty")
+            continue
+        count = content.count(edit.search)
+        if count == 0:
+            conflicts.append(f"Edit {index}: search text not found")
+        elif count > 1:
+            conflicts.append(f"Edit {index}: search text matches {count} times; include more context")
+        else:
+            content = content.replace(edit.search, edit.replace, 1)
+    return content, conflicts
@@ -1,40 +1,107 @@
-from enum import Enum
-import json
+import asyncio
+from contextlib import AsyncExitStack
 import time
 from typing import Any, Dict, Optional
 import uuid
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import update
 from google.adk.runners import Runner
-from google.adk.sessions import DatabaseSessionService
 from google.genai import types
-from google.adk.agents import SequentialAgent
-from google.adk.sessions import Session
+from google.adk.agents import ParallelAgent
+from google.adk.sessions import BaseSessionService, Session
 
 from app.agent.code_agent import CodeAgent
-from app.models.database import Project
-from app.services.sandbox_service import SandboxService
 from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.telemetry import RunTelemetry
+from app.core.utils import utcnow
+from app.models.database import Project
+from app.services.agent_service import is_default_project_name
+from app.services.blob_store import MANIFEST_KEY, blob_store
+from app.services.event_log import ActionType, create_event
+from app.services.file_cache import file_cache
+from app.services.history_writer import HistoryRecord, history_writer
+from app.services.output_buffer import OutputBuffer
+from app.services.sandbox_cache import sandbox_cache
+from app.services.sandbox_leases import sandbox_leases
+from app.services.sandbox_lifecycle import PACKAGE_JSON, sandbox_lifecycle
+from app.services.sandbox_pool import sandbox_pool
+from app.services.sandbox_registry import sandbox_registry
+from app.services.sandbox_service import INSTALL_COMMAND, SandboxConnectionError, SandboxService
+from app.core.session import get_session_service
 from app.agent.title_generator import TitleGenerator
 
-class ActionType(str, Enum):
-    MESSAGE = "message"
-    FILE_WRITE = "file_write"
-    FILE_READ= "file_read"
-    TERMINAL = "terminal"
-    COMPLETE = "complete"
-    ERROR = "error"
+# Queue marker telling the SSE loop that terminal output is waiting to be sent.
+TERMINAL_OUTPUT = object()
+
+# Sent instead of the user's message when an interrupted run is retried and the session already has it.
+RETRY_PROMPT = (
+    "Your previous attempt at my last request was interrupted. Continue it from where it stopped; "
+    "check the current state of the files before changing them."
+)
+
+_runner: Optional[Runner] = None
+
+def get_runner() -> Runner:
+    """Build the agent tree and its runner once per process.
+
+    Rebuilt when the session service has been closed and replaced, so a
+    restarted worker does not run on the closed one.
+    """
+    global _runner
+    session_service = get_session_service()
+    if _runner is None or _runner.session_service is not session_service:
+        _runner = _build_runner(session_service)
+    return _runner
+
+def _build_runner(session_service: BaseSessionService) -> Runner:
+    return Runner(
+        app_name="AgentX",
+        # The title only needs the user's request, so it is generated while the code agent works.
+        agent=ParallelAgent(
+            name="workflow_agent",
+            description="Runs the coding workflow and names the project concurrently.",
+            sub_agents=[
+                CodeAgent().agent(),
+                TitleGenerator().agent(),
+            ]
+        ),
+        session_service=session_service,
+        # artifact_service=self.artifact_service,
+    )
+
+def _last_user_message(session: Session) -> Optional[str]:
+    for event in reversed(session.events):
+        if event.author == "user" and event.content and event.content.parts:
+            return "".join(part.text or "" for part in event.content.parts)
+    return None
 
 class WorkflowService():
+    """Executes one agent run.
 
-    def __init__(self, db: Optional[AsyncSession]) -> None:
-        self.db = db
+    Runs take minutes, so no database session is held across one: the few
+    writes the workflow makes each use a short session of their own.
+    """
+
+    def __init__(self) -> None:
         self.sandbox = SandboxService()
-        self.memory_session = DatabaseSessionService(
-            db_url=settings.DATABASE_URL,
-        )
+        self.memory_session = get_session_service()
 
-    async def _init_sandbox(self, session_id: Optional[str]):
-        return await self.sandbox.connect(session_id)
+    async def _init_sandbox(self, stack: AsyncExitStack, sandbox_id: Optional[str]) -> str:
+        """Borrow a cached connection to the project's sandbox for the rest of the run.
+
+        Leases a fresh sandbox from the pool when the project has none yet or
+        its sandbox can no longer be reached.
+        """
+        if sandbox_id:
+            try:
+                self.sandbox = await stack.enter_async_context(sandbox_cache.lease(sandbox_id))
+                return sandbox_id
+            except SandboxConnectionError:
+                pass
+        sandbox = await sandbox_pool.lease()
+        sandbox_cache.put(sandbox)
+        self.sandbox = await stack.enter_async_context(sandbox_cache.lease(sandbox.sandbox_id))
+        return sandbox.sandbox_id
 
     async def _init_config(self, project_id: uuid.UUID):
         session = await self._get_session(project_id)
@@ -47,7 +114,7 @@ class WorkflowService():
                 session_id=str(project_id),
                 state={
                     "summary": "",
-                    "files": {},
+                    MANIFEST_KEY: {},
                 },
             )
 
@@ -58,70 +125,138 @@ class WorkflowService():
             session_id=str(project_id)
         )
 
-    async def _runner(self) -> Runner:
-        return Runner(
-            app_name="AgentX",
-            agent=SequentialAgent(
-                name="workflow_agent",
-                description="A sequential agent to handle coding workflows.",
-                sub_agents=[
-                    CodeAgent(sandbox=self.sandbox).agent(),
-                    TitleGenerator(sandbox=self.sandbox).agent(),
-                ]
-            ),
-            session_service=self.memory_session,
-            # artifact_service=self.artifact_service,
-        )
-    
-    async def execute_workflow(self, project: Project, message: str):
-        session = await self._init_config(project.id)
-        sandbox_id = await self._init_sandbox(project.sandbox_id)
-        if project.sandbox_id != sandbox_id:
-            await self._update_sandbox_id(project, sandbox_id)
-        runner = await self._runner()
-        content = types.Content(role='user', parts=[types.Part(text=message)])
+    async def execute_workflow(self, project: Project, message: str, retry: bool = False):
+        prompted_at = utcnow()
+        async with AsyncExitStack() as stack:
+            run = stack.enter_context(RunTelemetry(project.id))
+            with run.phase("session_init"):
+                session = await self._init_config(project.id)
+            with run.phase("sandbox_connect"):
+                previous_sandbox_id = project.sandbox_id
+                sandbox_id = await self._init_sandbox(stack, previous_sandbox_id)
+                if previous_sandbox_id != sandbox_id:
+                    await self._update_sandbox_id(project, sandbox_id)
+                await sandbox_leases.attach_sandbox(project.id, sandbox_id)
+            # The project's previous run may have been executed by another process.
+            file_cache.mark_stale(sandbox_id)
+            sandbox_lifecycle.touch(self.sandbox.sandbox)
+            stack.callback(sandbox_lifecycle.touch, self.sandbox.sandbox)
+            if previous_sandbox_id and previous_sandbox_id != sandbox_id:
+                with run.phase("sandbox_rehydrate"):
+                    restored = await sandbox_lifecycle.rehydrate(project.id, self.sandbox)
+                if restored:
+                    yield self._create_event(ActionType.MESSAGE, f"Previous sandbox is no longer available, restored {len(restored)} files into a new one.")
+                else:
+                    yield self._create_event(ActionType.MESSAGE, "Previous sandbox is no longer available, started a new one.")
+                if PACKAGE_JSON in restored:
+                    yield self._create_event(ActionType.TERMINAL, "Installing dependencies...", data={"command": INSTALL_COMMAND})
+                    with run.phase("sandbox_install"):
+                        await sandbox_lifecycle.install_dependencies(project.id, self.sandbox)
+            runner = get_runner()
+            sandbox_registry.register(project.id, self.sandbox)
+            stack.callback(sandbox_registry.unregister, project.id, self.sandbox)
 
-        async for event in runner.run_async(
-            user_id="user_123",
-            session_id=str(project.id),
-            new_message=content,
-        ):
-            try:
-                # Extract tool name from function call or response
-                tool_name = "Unknown"
-                event_fun = event.get_function_calls()
-                if event_fun and len(event_fun) > 0:
-                    tool_name = event_fun[0].name
-                    args = event_fun[0].args or {}
-                    match tool_name:
-                        case "_create_or_update_files":
-                            files = args.get("files", [])
-                            file_paths = [file.get("path") for file in files]
-                            yield self._create_event(ActionType.FILE_WRITE, "Updating files...", data={"files": file_paths})
-                        case "_read_files":
-                            yield self._create_event(ActionType.FILE_READ, "Reading files...", data={"files": args.get("paths", [])})
-                        case "_run_terminal":
-                            yield self._create_event(ActionType.TERMINAL, "Executing terminal command...", data={"command": args.get("command", "")})
-                        case _:
-                            yield self._create_event(ActionType.MESSAGE, "Thinking...")
-                if event.is_final_response():
-                    break
-            except Exception as e:
-                yield self._create_event(ActionType.ERROR, "Error: " + str(e))
-
-        url = await self.sandbox.get_sandbox_url()
-        session = await self._get_session(project.id)
-        if not session:
-            raise Exception("Session not found after workflow execution.")
-        
-        yield self._create_event(ActionType.COMPLETE, "Task completed.", data= {
-            "title": session.state.get("title", ""),
-            "summary": session.state.get("summary", "").replace("<task_summary>", "").replace("</task_summary>", ""),
-            "files": session.state.get("files", []),
-            "sandbox_id": self.sandbox.sandbox.sandbox_id if self.sandbox.sandbox else "",
-            "url": url,
-        })
+            # Agent events and live terminal output are merged into one queue; None marks the end of the run.
+            events: asyncio.Queue = asyncio.Queue()
+            # Capped like command output, so a slow client doesn't make it grow without bound.
+            pending_output = OutputBuffer()
+
+            def forward_output(stream: str, data: str) -> None:
+                if not pending_output:
+                    events.put_nowait(TERMINAL_OUTPUT)
+                pending_output.write(data)
+
+            self.sandbox.output_listener = forward_output
+            agent_started = time.perf_counter()
+            # The agent task runs in the run's telemetry context so its tool and sandbox calls are attributed to it.
+            prompt = RETRY_PROMPT if retry and _last_user_message(session) == message else message
+            agent_task = asyncio.create_task(self._run_agent(runner, project, prompt, events, run), context=run.context())
+            stack.push_async_callback(self._stop_agent, agent_task)
+
+            while (event := await events.get()) is not None:
+                if event is TERMINAL_OUTPUT:
+                    # Everything that arrived since the marker was queued goes out as one event.
+                    output = pending_output.getvalue()
+                    pending_output.clear()
+                    yield self._create_event(ActionType.TERMINAL, "Terminal output", data={"output": output})
+                else:
+                    yield event
+            await agent_task
+            run.record_phase("agent", agent_started)
+
+            with run.phase("complete"):
+                url = await self.sandbox.get_sandbox_url()
+                session = await self._get_session(project.id)
+                if not session:
+                    raise Exception("Session not found after workflow execution.")
 
+                title = session.state.get("title", "").strip().strip('"')
+                summary = session.state.get("summary", "").replace("<task_summary>", "").replace("</task_summary>", "")
+                files = await blob_store.materialize_state(session.state)
+            data = {
+                "title": title,
+                "summary": summary,
+                "files": files,
+                "sandbox_id": sandbox_id,
+                "url": url,
+            }
+            if settings.RUN_TIMINGS_IN_COMPLETE:
+                data["timings"] = run.summary()
+            yield self._create_event(ActionType.COMPLETE, "Task completed.", data=data)
+
+            if title and is_default_project_name(project.name):
+                await self._update_project_name(project, title)
+            # Stored after the client has its result; the writer batches the inserts in the background.
+            await history_writer.submit(HistoryRecord(
+                project_id=project.id,
+                prompt=message,
+                result=summary,
+                fragment={"title": title or project.name, "sandbox_url": url, "files": session.state.get(MANIFEST_KEY) or {}},
+                prompted_at=prompted_at,
+            ))
+
+    async def _run_agent(self, runner: Runner, project: Project, message: str, events: asyncio.Queue, run: RunTelemetry) -> None:
+        """Run the agent and put an SSE event on the queue for each tool call."""
+        content = types.Content(role='user', parts=[types.Part(text=message)])
+        started = time.perf_counter()
+        try:
+            async for event in runner.run_async(
+                user_id="user_123",
+                session_id=str(project.id),
+                new_message=content,
+                state_delta={"project_id": str(project.id)},
+            ):
+                if event.author == "title_generator" and event.is_final_response():
+                    run.record_phase("title", started)
+                try:
+                    # Extract tool name from function call or response
+                    tool_name = "Unknown"
+                    event_fun = event.get_function_calls()
+                    if event_fun and len(event_fun) > 0:
+                        tool_name = event_fun[0].name
+                        args = event_fun[0].args or {}
+                        match tool_name:
+                            case "_create_or_update_files":
+                                files = args.get("files", [])
+                                file_paths = [file.get("path") for file in files]
+                                events.put_nowait(self._create_event(ActionType.FILE_WRITE, "Updating files...", data={"files": file_paths}))
+                            case "_edit_file":
+                                events.put_nowait(self._create_event(ActionType.FILE_WRITE, "Editing files...", data={"files": [args.get("path")]}))
+                            case "_read_files":
+                                events.put_nowait(self._create_event(ActionType.FILE_READ, "Reading files...", data={"files": args.get("paths", [])}))
+                            case "_run_terminal":
+                                events.put_nowait(self._create_event(ActionType.TERMINAL, "Executing terminal command...", data={"command": args.get("command", "")}))
+                            case _:
+                                events.put_nowait(self._create_event(ActionType.MESSAGE, "Thinking..."))
+                except Exception as e:
+                    events.put_nowait(self._create_event(ActionType.ERROR, "Error: " + str(e)))
+        finally:
+            events.put_nowait(None)
+
+    async def _stop_agent(self, agent_task: asyncio.Task) -> None:
+        """Cancel the agent if the run ends early, and wait for it to unwind."""
+        agent_task.cancel()
+        await asyncio.gather(agent_task, return_exceptions=True)
 
     def _create_event(
         self,
@@ -129,20 +264,21 @@ class WorkflowService():
         message: str,
         data: Optional[Dict[str, Any]] = None
     ) -> str:
-        """Create a Server-Sent Event with structured action data."""
-        event_data = {
-            "action": action.value,
-            "message": message,
-            "timestamp": time.time(),
-        }
-        if data:
-            event_data["data"] = data
-        return f"data: {json.dumps(event_data)}\n\n"
+        return create_event(action, message, data)
     
+    async def _update_project_name(self, project: Project, name: str) -> None:
+        """Name the project after the generated title, unless the user has renamed it during the run."""
+        unchanged = Project.name.is_(None) if project.name is None else Project.name == project.name
+        await self._update_project(project, unchanged, name=name)
+
     async def _update_sandbox_id(self, project: Project, sandbox_id: str) -> None:
         """Update the project's sandbox_id in the database."""
-        if self.db is None:
-            raise Exception("Database session is not available.")
-        project.sandbox_id = sandbox_id
-        self.db.add(project)
-        await self.db.commit()
\ No newline at end of file
+        await self._update_project(project, sandbox_id=sandbox_id)
+
+    async def _update_project(self, project: Project, *conditions: Any, **values: Any) -> None:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(update(Project).where(Project.id == project.id, *conditions).values(**values))
+            await db.commit()
+        if result.rowcount:
+            for key, value in values.items():
+                setattr(project, key, value)
\ No newline at end of file
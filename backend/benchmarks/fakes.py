@@ -0,0 +1,202 @@
+"""In-memory stand-ins for the model and the E2B sandbox used by the benchmarks."""
+import asyncio
+import itertools
+import json
+import posixpath
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, AsyncGenerator, Callable, Optional
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+from app.services.file_cache import SANDBOX_HOME
+from app.services.sandbox_pool import SandboxBackend
+
+
+@dataclass
+class FakeCommandResult:
+    stdout: str
+    stderr: str = ""
+    exit_code: int = 0
+
+
+@dataclass
+class FakeEntryInfo:
+    name: str
+    path: str
+    size: int
+    modified_time: datetime
+
+
+class FakeFilesystem:
+    """Implements the subset of ``AsyncSandbox.files`` the app uses."""
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self._files: dict[str, tuple[str, datetime]] = {}
+
+    async def write(self, path: str, data: str) -> None:
+        await asyncio.sleep(self.latency)
+        self._files[_resolve(path)] = (data, datetime.now(timezone.utc))
+
+    async def write_files(self, files: list[dict]) -> None:
+        await asyncio.sleep(self.latency)
+        now = datetime.now(timezone.utc)
+        for file in files:
+            self._files[_resolve(file["path"])] = (file["data"], now)
+
+    async def read(self, path: str) -> str:
+        await asyncio.sleep(self.latency)
+        return self._get(path)[0]
+
+    async def get_info(self, path: str) -> FakeEntryInfo:
+        await asyncio.sleep(self.latency)
+        path = _resolve(path)
+        content, modified = self._get(path)
+        return FakeEntryInfo(posixpath.basename(path), path, len(content), modified)
+
+    async def list(self, path: str, depth: int = 1) -> list[FakeEntryInfo]:
+        await asyncio.sleep(self.latency)
+        prefix = _resolve(path).rstrip("/") + "/"
+        return [
+            FakeEntryInfo(posixpath.basename(name), name, len(content), modified)
+            for name, (content, modified) in self._files.items()
+            if name.startswith(prefix) and name[len(prefix):].count("/") < depth
+        ]
+
+    def _get(self, path: str) -> tuple[str, datetime]:
+        try:
+            return self._files[_resolve(path)]
+        except KeyError:
+            raise FileNotFoundError(path) from None
+
+
+class FakeCommands:
+    """Implements ``AsyncSandbox.commands.run``: echoes a few output lines and succeeds.
+
+    The port check reports a listening server so error checks come back clean.
+    """
+
+    def __init__(self, latency: float = 0.0, output_lines: int = 5) -> None:
+        self.latency = latency
+        self.output_lines = output_lines
+
+    async def run(
+        self,
+        command: str,
+        on_stdout: Optional[Callable[[str], None]] = None,
+        on_stderr: Optional[Callable[[str], None]] = None,
+        **kwargs: Any,
+    ) -> FakeCommandResult:
+        if command.startswith("lsof"):
+            return FakeCommandResult("node    42 user   20u  IPv6  TCP *:3000 (LISTEN)\n")
+        lines = [f"[{command.split()[0]}] step {i + 1}/{self.output_lines}\n" for i in range(self.output_lines)]
+        for line in lines:
+            if on_stdout:
+                on_stdout(line)
+            await asyncio.sleep(self.latency / max(1, self.output_lines))
+        return FakeCommandResult("".join(lines))
+
+
+class FakeSandbox:
+    _ids = itertools.count(1)
+
+    def __init__(self, file_latency: float = 0.0, command_latency: float = 0.0) -> None:
+        self.sandbox_id = f"fake-{next(self._ids)}"
+        self.files = FakeFilesystem(file_latency)
+        self.commands = FakeCommands(command_latency)
+
+    def get_host(self, port: int) -> str:
+        return f"{port}-{self.sandbox_id}.sandbox.local"
+
+
+class FakeSandboxBackend(SandboxBackend):
+    """Keeps sandboxes in memory so they can be reconnected to by id."""
+
+    def __init__(self, file_latency: float = 0.0, command_latency: float = 0.0) -> None:
+        self.file_latency = file_latency
+        self.command_latency = command_latency
+        self.sandboxes: dict[str, FakeSandbox] = {}
+
+    async def create(self, template: str) -> FakeSandbox:
+        sandbox = FakeSandbox(self.file_latency, self.command_latency)
+        self.sandboxes[sandbox.sandbox_id] = sandbox
+        return sandbox
+
+    async def connect(self, sandbox_id: str) -> FakeSandbox:
+        try:
+            return self.sandboxes[sandbox_id]
+        except KeyError:
+            raise RuntimeError(f"Sandbox {sandbox_id} not found") from None
+
+    async def is_healthy(self, sandbox: FakeSandbox) -> bool:
+        return sandbox.sandbox_id in self.sandboxes
+
+    async def pause(self, sandbox_id: str) -> None:
+        pass
+
+    async def kill(self, sandbox: FakeSandbox) -> None:
+        self.sandboxes.pop(sandbox.sandbox_id, None)
+
+    async def kill_by_id(self, sandbox_id: str) -> None:
+        self.sandboxes.pop(sandbox_id, None)
+
+
+class ScriptedLlm(BaseLlm):
+    """Replays a recorded sequence of model turns through ADK.
+
+    Each step is either ``{"tool": name, "args": {...}}`` or ``{"text": ...}``.
+    The step to replay is the number of model turns since the latest user
+    prompt, so one instance serves any number of concurrent runs.
+    """
+
+    steps: list[dict]
+    latency: float = 0.0
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        await asyncio.sleep(self.latency)
+        step = self.steps[min(_turns_since_prompt(llm_request.contents), len(self.steps) - 1)]
+        if "tool" in step:
+            part = types.Part(function_call=types.FunctionCall(name=step["tool"], args=step.get("args", {})))
+        else:
+            part = types.Part(text=step["text"])
+        yield LlmResponse(content=types.Content(role="model", parts=[part]))
+
+
+@dataclass
+class BenchmarkScript:
+    prompt: str
+    title: str
+    steps: list[dict]
+    model_latency: float = 0.0
+
+    @classmethod
+    def load(cls, path: Path) -> "BenchmarkScript":
+        data = json.loads(Path(path).read_text())
+        return cls(data["prompt"], data["title"], data["steps"], data.get("model_latency_ms", 0) / 1000)
+
+    def code_model(self) -> ScriptedLlm:
+        return ScriptedLlm(model="scripted-code", steps=self.steps, latency=self.model_latency)
+
+    def title_model(self) -> ScriptedLlm:
+        return ScriptedLlm(model="scripted-title", steps=[{"text": self.title}], latency=self.model_latency)
+
+
+def _turns_since_prompt(contents: list[types.Content]) -> int:
+    turns = 0
+    for content in reversed(contents):
+        if content.role == "user" and any(part.text for part in content.parts or ()):
+            break
+        if content.role == "model":
+            turns += 1
+    return turns
+
+
+def _resolve(path: str) -> str:
+    return posixpath.normpath(posixpath.join(SANDBOX_HOME, path))
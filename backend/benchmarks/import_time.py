@@ -0,0 +1,71 @@
+"""Cold-start import benchmark.
+
+Imports the API app in fresh interpreters and reports how long it takes,
+with and without loading the agent stack, and which heavy packages each
+variant pulls in. Run from ``backend/``:
+
+    python -m benchmarks.import_time --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Optional
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ("google.adk", "google.genai", "e2b", "litellm")
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "modules": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+VARIANTS = {
+    # What an API process does before serving its first request with RUN_WORKERS_ENABLED=false.
+    "api": "import main",
+    # What a process with workers additionally loads at startup.
+    "api+agents": "import main\nfrom app.services.workflow_service import get_runner\nget_runner()",
+}
+
+
+def measure(code: str) -> dict:
+    env = {**os.environ, "RUN_WORKERS_ENABLED": "false", "PYTHONDONTWRITEBYTECODE": "1"}
+    output = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", PROBE.format(code=code, heavy=HEAVY_MODULES)],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per variant")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = {}
+    for name, code in VARIANTS.items():
+        runs = [measure(code) for _ in range(args.repeat)]
+        seconds = [run["seconds"] * 1000 for run in runs]
+        report[name] = {
+            "median_ms": statistics.median(seconds),
+            "min_ms": min(seconds),
+            "max_ms": max(seconds),
+            "heavy_modules": runs[-1]["modules"],
+        }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    for name, result in report.items():
+        print(f"{name:<12} median {result['median_ms']:7.0f} ms  min {result['min_ms']:7.0f} ms  "
+              f"max {result['max_ms']:7.0f} ms  loads: {', '.join(result['heavy_modules']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
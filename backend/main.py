@@ -1,18 +1,49 @@
 import uuid
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from app.api.metrics import router as metrics_router
+from app.api.rate_limit import RateLimitHeadersMiddleware
 from app.api.router import router
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.services.workflow_service import WorkflowService
+import worker
+from app.core.config import settings
+from app.services.event_log import event_log_store
+from app.services.quota import quota_engine
+from app.services.sandbox_cache import sandbox_cache
+from app.services.sandbox_leases import sandbox_leases
+from app.services.sandbox_lifecycle import sandbox_lifecycle
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await sandbox_cache.start()
+    await sandbox_leases.start()
+    await sandbox_lifecycle.start()
+    await event_log_store.start()
+    await quota_engine.start()
+    # Without workers this process only queues runs and never loads the agent stack; see worker.py.
+    if settings.RUN_WORKERS_ENABLED:
+        await worker.start()
+    yield
+    if settings.RUN_WORKERS_ENABLED:
+        await worker.stop()
+    await quota_engine.stop()
+    await event_log_store.stop()
+    await sandbox_lifecycle.stop()
+    await sandbox_leases.stop()
+    await sandbox_cache.stop()
+
+app = FastAPI(lifespan=lifespan)
 
 @app.get("/")
 async def root():
     return {"message": "Success"}
 
-app.add_middleware(CORSMiddleware,allow_origins=["*"],allow_methods=["*"],allow_headers=["*"])
+app.add_middleware(RateLimitHeadersMiddleware)
+app.add_middleware(CORSMiddleware,allow_origins=["*"],allow_methods=["*"],allow_headers=["*"],expose_headers=["X-Run-Id", "RateLimit-Limit", "RateLimit-Remaining", "RateLimit-Reset", "Retry-After"])
 
 app.include_router(router)
+if settings.METRICS_ENABLED:
+    app.include_router(metrics_router)
     
\ No newline at end of file
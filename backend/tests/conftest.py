@@ -0,0 +1,38 @@
+import os
+import tempfile
+
+import pytest
+from sqlalchemy import event
+
+# The app reads its settings and creates its engine at import time.
+_workdir = tempfile.mkdtemp(prefix="agentx-tests-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_workdir}/test.db"
+os.environ["RUN_WORKERS_ENABLED"] = "false"
+
+from app.core.database import AsyncSessionLocal, engine  # noqa: E402
+from app.models.database import Base, Project  # noqa: E402
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def _enforce_foreign_keys(dbapi_connection, _) -> None:
+    # As Postgres does; SQLite ignores foreign keys unless asked.
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def project_id(anyio_backend):
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.drop_all)
+        await connection.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as db:
+        project = Project(name="Test project")
+        db.add(project)
+        await db.commit()
+        return project.id
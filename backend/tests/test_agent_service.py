@@ -0,0 +1,54 @@
+from datetime import timedelta
+
+import pytest
+
+from app.core.database import AsyncSessionLocal
+from app.core.utils import utcnow
+from app.models.database import MessageRole
+from app.schemas.project import ProjectDetailsResponse
+from app.services.agent_service import AgentService
+from app.services.history_writer import HistoryRecord, history_writer
+
+pytestmark = pytest.mark.anyio
+
+
+async def chat(project_id, turns: int) -> None:
+    start = utcnow() - timedelta(hours=1)
+    await history_writer.write([
+        HistoryRecord(
+            project_id=project_id,
+            prompt=f"prompt {i}",
+            result=f"result {i}",
+            prompted_at=start + timedelta(minutes=2 * i),
+            completed_at=start + timedelta(minutes=2 * i + 1),
+        )
+        for i in range(turns)
+    ])
+
+
+async def test_details_without_paging_return_the_full_history_oldest_first(project_id):
+    await chat(project_id, 30)
+    async with AsyncSessionLocal() as db:
+        details = await AgentService(db).get_project_details(project_id)
+
+    response = ProjectDetailsResponse.model_validate(details)
+    assert len(response.messages) == 60
+    assert [message.content for message in response.messages[:2]] == ["prompt 0", "result 0"]
+    assert response.messages[0].role == MessageRole.USER
+    assert response.next_cursor is None
+
+
+async def test_details_pages_newest_first(project_id):
+    await chat(project_id, 3)
+    pages = []
+    cursor = None
+    async with AsyncSessionLocal() as db:
+        service = AgentService(db)
+        while True:
+            details = await service.get_project_details(project_id, limit=4, cursor=cursor)
+            pages.append([message["content"] for message in details["messages"]])
+            cursor = details["next_cursor"]
+            if cursor is None:
+                break
+
+    assert pages == [["result 2", "prompt 2", "result 1", "prompt 1"], ["result 0", "prompt 0"]]
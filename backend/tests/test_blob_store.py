@@ -0,0 +1,53 @@
+import zlib
+
+import pytest
+from sqlalchemy import select
+
+from app.core.database import AsyncSessionLocal
+from app.models.database import FileBlob
+from app.services.blob_store import MANIFEST_KEY, BlobStore, content_hash
+
+pytestmark = pytest.mark.anyio
+
+
+async def _blobs() -> dict[str, bytes]:
+    async with AsyncSessionLocal() as db:
+        return dict((await db.execute(select(FileBlob.hash, FileBlob.data))).all())
+
+
+async def test_put_stores_each_content_once(project_id):
+    store = BlobStore()
+    manifest = await store.put({"a.ts": "same", "b.ts": "same", "c.ts": "other"})
+    assert manifest == {"a.ts": content_hash("same"), "b.ts": content_hash("same"), "c.ts": content_hash("other")}
+
+    # Writing the same content again, e.g. from another run, is not an error.
+    await store.put({"d.ts": "same"})
+
+    blobs = await _blobs()
+    assert sorted(blobs) == sorted({content_hash("same"), content_hash("other")})
+    assert zlib.decompress(blobs[content_hash("same")]).decode() == "same"
+
+
+async def test_materialize_reads_back_from_the_database(project_id):
+    manifest = await BlobStore().put({"a.ts": "one", "b.ts": "two"})
+
+    # A fresh store has nothing cached, as in another process.
+    store = BlobStore()
+    assert await store.materialize(manifest) == {"a.ts": "one", "b.ts": "two"}
+    assert await store.materialize({"gone.ts": content_hash("never stored")}) == {}
+
+
+async def test_materialize_state_merges_old_and_new_sessions(project_id):
+    store = BlobStore()
+    manifest = await store.put({"new.ts": "new"})
+    state = {"files": {"old.ts": "old"}, MANIFEST_KEY: manifest}
+    assert await store.materialize_state(state) == {"old.ts": "old", "new.ts": "new"}
+
+
+async def test_materialize_files_tells_manifests_from_contents(project_id):
+    store = BlobStore()
+    manifest = await store.put({"a.ts": "one"})
+    assert await store.materialize_files(manifest) == {"a.ts": "one"}
+
+    old_fragment = {"a.ts": "one", "hash.txt": content_hash("looks like a hash")}
+    assert await store.materialize_files(old_fragment) == old_fragment
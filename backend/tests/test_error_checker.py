@@ -0,0 +1,59 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.error_checker import (
+    BUILD_CHECK_COMMAND,
+    FINGERPRINT_COMMAND,
+    PORT_CHECK_COMMAND,
+    ErrorChecker,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeSandbox:
+    def __init__(self, sandbox_id: str = "sbx") -> None:
+        self.sandbox_id = sandbox_id
+        self.fingerprint = "abc"
+        self.listening = True
+        self.ran: list[str] = []
+        self.commands = self
+
+    async def run(self, command: str):
+        self.ran.append(command)
+        if command == FINGERPRINT_COMMAND:
+            stdout = self.fingerprint
+        elif command == PORT_CHECK_COMMAND:
+            stdout = "node 1 LISTEN" if self.listening else ""
+        else:
+            stdout = ""
+        return SimpleNamespace(stdout=stdout, stderr="", exit_code=0)
+
+
+async def test_unchanged_sources_skip_the_build_but_not_the_server_check():
+    checker = ErrorChecker()
+    sandbox = FakeSandbox()
+    assert (await checker.check(sandbox)).ok
+
+    sandbox.ran.clear()
+    result = await checker.check(sandbox)
+    assert result.ok and result.skipped
+    assert BUILD_CHECK_COMMAND not in sandbox.ran
+
+    sandbox.listening = False
+    result = await checker.check(sandbox)
+    assert not result.ok
+    assert [diagnostic.source for diagnostic in result.diagnostics] == ["server"]
+
+
+async def test_clean_fingerprints_are_bounded():
+    checker = ErrorChecker(max_size=2)
+    sandboxes = [FakeSandbox(f"sbx-{i}") for i in range(3)]
+    for sandbox in sandboxes:
+        await checker.check(sandbox)
+
+    sandboxes[0].ran.clear()
+    result = await checker.check(sandboxes[0])
+    assert not result.skipped
+    assert BUILD_CHECK_COMMAND in sandboxes[0].ran
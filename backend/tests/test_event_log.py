@@ -0,0 +1,40 @@
+import uuid
+
+import pytest
+
+from app.core.database import AsyncSessionLocal
+from app.models.database import AgentRun, RunStatus
+from app.services.event_log import EventLogBacklogError, EventLogStore, RunEventLog
+
+pytestmark = pytest.mark.anyio
+
+
+def test_unpersisted_events_stay_in_memory_until_the_backlog_is_full():
+    log = RunEventLog(uuid.uuid4(), uuid.uuid4(), memory_limit=2, max_backlog=3)
+    for i in range(3):
+        log.append(f"event {i}")
+        log.check_backlog()
+    assert [event.id for event in log.since(0)] == [1, 2, 3]
+
+    log.append("event 3")
+    with pytest.raises(EventLogBacklogError):
+        log.check_backlog()
+
+
+async def test_flush_lets_persisted_events_leave_memory(project_id):
+    async with AsyncSessionLocal() as db:
+        run = AgentRun(project_id=project_id, message="hello", status=RunStatus.RUNNING, attempts=1)
+        db.add(run)
+        await db.commit()
+    store = EventLogStore()
+    log = store.create(project_id, run.id)
+    log.memory_limit = 2
+    for i in range(3):
+        log.append(f"event {i}")
+
+    await store.flush()
+    log.append("event 3")
+
+    assert log.persisted_id == 3
+    assert [event.id for event in log.since(0)] == [3, 4]
+    assert [event.payload for event in await store.load(run.id, after=0)] == ["event 0", "event 1", "event 2"]
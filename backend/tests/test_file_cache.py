@@ -0,0 +1,51 @@
+import pytest
+
+from benchmarks.fakes import FakeSandbox
+from app.services.file_cache import FileContentCache, file_cache
+from app.services.sandbox_service import SandboxService
+
+pytestmark = pytest.mark.anyio
+
+
+def test_read_content_is_served_only_for_the_same_version():
+    cache = FileContentCache()
+    cache.put("sbx", "src/page.tsx", "template", (1.0, 5), "hello")
+
+    assert cache.get("sbx", "/home/user/src/page.tsx", "template", (1.0, 5)) == "hello"
+    assert cache.get("sbx", "src/page.tsx", "template", (2.0, 5)) is None
+    assert cache.get("sbx", "src/page.tsx", "template", (1.0, 6)) is None
+    # Only content this process wrote is trusted without a version.
+    assert cache.get_trusted("sbx", "src/page.tsx") is None
+
+
+def test_written_content_is_trusted_until_the_sandbox_goes_stale():
+    cache = FileContentCache()
+    cache.put_written("sbx", "src/page.tsx", "ours")
+    assert cache.get_trusted("sbx", "src/page.tsx") == "ours"
+
+    cache.mark_stale("sbx")
+    assert cache.get_trusted("sbx", "src/page.tsx") is None
+
+
+def test_template_files_are_shared_until_a_sandbox_writes_them():
+    cache = FileContentCache()
+    cache.put("sbx-1", "package.json", "template", (1.0, 2), "{}")
+    assert cache.get("sbx-2", "package.json", "template", (1.0, 2)) == "{}"
+    assert cache.get("sbx-4", "package.json", "other-template", (1.0, 2)) is None
+
+    cache.put_written("sbx-3", "package.json", '{"name": "app"}')
+    cache.mark_stale("sbx-3")
+    assert cache.get("sbx-3", "package.json", "template", (1.0, 2)) is None
+
+
+async def test_files_changed_behind_the_cache_are_read_again():
+    sandbox = FakeSandbox()
+    service = SandboxService(sandbox)
+    await sandbox.files.write("src/page.tsx", "v1")
+    assert await service.read_file("src/page.tsx") == "v1"
+
+    # Written by another process, e.g. a worker, so this cache never saw the write.
+    await sandbox.files.write("src/page.tsx", "v2 from elsewhere")
+    assert await service.read_file("src/page.tsx") == "v2 from elsewhere"
+
+    file_cache.invalidate(sandbox.sandbox_id, "src/page.tsx")
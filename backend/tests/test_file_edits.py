@@ -0,0 +1,63 @@
+import pytest
+
+from benchmarks.fakes import FakeSandbox
+from app.services.blob_store import content_hash
+from app.services.sandbox_service import FileEdit, SandboxService, apply_edits
+
+pytestmark = pytest.mark.anyio
+
+PAGE = "export default function Page() {\n  return <h1>Hello</h1>;\n}\n"
+
+
+def test_edits_apply_in_order():
+    content, conflicts = apply_edits(PAGE, [
+        FileEdit(search="Hello", replace="Hi"),
+        FileEdit(search="<h1>Hi</h1>", replace="<h2>Hi</h2>"),
+    ])
+    assert conflicts == []
+    assert "<h2>Hi</h2>" in content
+
+
+def test_missing_ambiguous_and_empty_search_texts_conflict():
+    _, conflicts = apply_edits(PAGE, [
+        FileEdit(search="Goodbye", replace="x"),
+        FileEdit(search="h1", replace="h2"),
+        FileEdit(search="", replace="x"),
+    ])
+    assert conflicts == [
+        "Edit 1: search text not found",
+        "Edit 2: search text matches 2 times; include more context",
+        "Edit 3: search text is empty",
+    ]
+
+
+@pytest.fixture
+async def service() -> SandboxService:
+    sandbox = FakeSandbox()
+    await sandbox.files.write("src/page.tsx", PAGE)
+    return SandboxService(sandbox)
+
+
+async def test_edit_file_writes_when_the_base_hash_matches(service):
+    result = await service.edit_file(
+        "src/page.tsx", [{"search": "Hello", "replace": "Hi"}], base_hash=content_hash(PAGE)[:8]
+    )
+    assert not result.conflicts and not result.error
+    assert await service.sandbox.files.read("src/page.tsx") == PAGE.replace("Hello", "Hi")
+
+
+@pytest.mark.parametrize("base_hash", [content_hash("something else"), content_hash(PAGE)[:7]])
+async def test_edit_file_rejects_a_stale_or_short_base_hash(service, base_hash):
+    result = await service.edit_file("src/page.tsx", [{"search": "Hello", "replace": "Hi"}], base_hash=base_hash)
+    assert result.conflicts and result.conflicts[0].startswith("File changed since it was read")
+    assert await service.sandbox.files.read("src/page.tsx") == PAGE
+
+
+async def test_edit_file_writes_nothing_when_any_edit_conflicts(service):
+    result = await service.edit_file("src/page.tsx", [
+        {"search": "Hello", "replace": "Hi"},
+        {"search": "Goodbye", "replace": "Bye"},
+    ])
+    assert result.conflicts == ["Edit 2: search text not found"]
+    assert result.content == PAGE
+    assert await service.sandbox.files.read("src/page.tsx") == PAGE
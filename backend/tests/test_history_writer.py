@@ -0,0 +1,22 @@
+import uuid
+
+import pytest
+from sqlalchemy import select
+
+from app.core.database import AsyncSessionLocal
+from app.models.database import Message
+from app.services.history_writer import HistoryRecord, HistoryWriter
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_a_bad_record_does_not_drop_the_rest_of_its_batch(project_id):
+    writer = HistoryWriter(max_retries=0)
+    good = HistoryRecord(project_id=project_id, prompt="hello", result="hi")
+    orphan = HistoryRecord(project_id=uuid.uuid4(), prompt="lost", result="lost")
+
+    await writer._write_with_retries([good, orphan])
+
+    async with AsyncSessionLocal() as db:
+        contents = (await db.execute(select(Message.content).order_by(Message.created_at))).scalars().all()
+    assert contents == ["hello", "hi"]
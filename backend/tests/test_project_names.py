@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select, update
+
+from app.core.database import AsyncSessionLocal
+from app.models.database import Project
+from app.services.agent_service import AgentService, is_default_project_name
+
+pytestmark = pytest.mark.anyio
+
+
+async def create(count: int) -> None:
+    async with AsyncSessionLocal() as db:
+        await AgentService(db).create_agent_projects(count)
+
+
+async def test_concurrent_creates_get_distinct_default_names(project_id):
+    await asyncio.gather(*(create(3) for _ in range(10)))
+
+    async with AsyncSessionLocal() as db:
+        names = (await db.execute(select(Project.name).where(Project.id != project_id))).scalars().all()
+    assert len(names) == 30
+    assert len(set(names)) == 30
+
+
+def test_only_generated_names_count_as_default():
+    assert is_default_project_name("New Project 12")
+    assert is_default_project_name(None)
+    assert not is_default_project_name("New Project 12 (copy)")
+    assert not is_default_project_name("My shop")
+
+
+async def test_generated_title_does_not_replace_a_name_set_during_the_run(project_id):
+    from app.services.workflow_service import WorkflowService
+
+    async with AsyncSessionLocal() as db:
+        project = (await AgentService(db).create_agent_projects(1))[0]
+        renamed = (await AgentService(db).create_agent_projects(1))[0]
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(Project).where(Project.id == renamed.id).values(name="My shop"))
+        await db.commit()
+    service = WorkflowService()
+
+    await service._update_project_name(project, "Todo App")
+    await service._update_project_name(renamed, "Todo App")
+
+    async with AsyncSessionLocal() as db:
+        assert (await db.get(Project, project.id)).name == "Todo App"
+        assert (await db.get(Project, renamed.id)).name == "My shop"
+    assert project.name == "Todo App"
+    assert renamed.name != "Todo App"
@@ -0,0 +1,74 @@
+import time
+
+import httpx
+import pytest
+
+from app.api import rate_limit
+from app.services import quota
+from app.services.quota import CHAT_QUOTA, QuotaEngine, QuotaPolicy
+
+pytestmark = pytest.mark.anyio
+
+POLICY = QuotaPolicy("test", points=2, duration=10)
+
+
+@pytest.fixture
+def clock(monkeypatch) -> list[float]:
+    # Ahead of the real clock, which new buckets still read their start time from.
+    now = [time.monotonic() + 1000]
+    monkeypatch.setattr(quota.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_buckets_refill_at_the_policy_rate(clock):
+    engine = QuotaEngine()
+    assert engine.consume(POLICY, "client").allowed
+    assert engine.consume(POLICY, "client").allowed
+
+    result = engine.consume(POLICY, "client")
+    assert not result.allowed
+    assert result.retry_after == 5
+    assert engine.consume(POLICY, "other-client").allowed
+
+    clock[0] += 5
+    assert engine.consume(POLICY, "client").allowed
+    assert not engine.consume(POLICY, "client").allowed
+
+    # Never more than the full budget, however long the client stays away.
+    clock[0] += 1000
+    assert engine.consume(POLICY, "client").remaining == 1
+
+
+def test_refund_gives_back_unsynced_points(clock):
+    engine = QuotaEngine()
+    assert engine.refund(POLICY, "client") is None
+
+    engine.consume(POLICY, "client")
+    engine.consume(POLICY, "client")
+    result = engine.refund(POLICY, "client")
+    assert result.allowed and result.remaining == 1
+    assert engine._buckets["test:client"].pending == 1
+
+
+async def test_engines_share_the_window_through_the_usage_table(project_id):
+    first, second = QuotaEngine(), QuotaEngine()
+    first.consume(POLICY, "client")
+    await first.sync()
+
+    second.consume(POLICY, "client")
+    await second.sync()
+    assert not second.consume(POLICY, "client").allowed
+
+
+async def test_duplicate_submissions_are_refunded(project_id, monkeypatch):
+    from main import app
+
+    monkeypatch.setattr(rate_limit, "quota_engine", QuotaEngine())
+    headers = {"Idempotency-Key": "retry-1"}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        first = await client.post(f"/project/{project_id}/runs", json={"message": "Build a todo app"}, headers=headers)
+        retry = await client.post(f"/project/{project_id}/runs", json={"message": "Build a todo app"}, headers=headers)
+
+    assert first.status_code == retry.status_code == 202
+    assert retry.json()["id"] == first.json()["id"]
+    assert first.headers["RateLimit-Remaining"] == retry.headers["RateLimit-Remaining"] == str(CHAT_QUOTA.points - 1)
@@ -0,0 +1,101 @@
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select, update
+
+from app.core.database import AsyncSessionLocal
+from app.core.utils import utcnow
+from app.models.database import AgentRun, RunStatus, WorkflowEvent
+from app.services.project_lock import project_locks
+from app.services.run_manager import RunManager
+
+pytestmark = pytest.mark.anyio
+
+
+async def get_run(run_id) -> AgentRun:
+    async with AsyncSessionLocal() as db:
+        return await db.get(AgentRun, run_id)
+
+
+async def go_stale(run_id) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(AgentRun).where(AgentRun.id == run_id).values(heartbeat_at=utcnow() - timedelta(hours=1)))
+        await db.commit()
+
+
+async def test_claim_takes_one_run_per_project(project_id):
+    manager = RunManager()
+    first, _ = await manager.submit(project_id, "first")
+    await manager.submit(project_id, "second")
+
+    claimed = await manager.claim()
+
+    assert claimed.id == first.id
+    assert claimed.status == RunStatus.RUNNING
+    assert claimed.worker_id == manager.worker_id
+    assert claimed.attempts == 1
+    # The second message waits until the first run is finished.
+    assert await manager.claim() is None
+
+
+async def test_idempotency_key_returns_the_earlier_run(project_id):
+    manager = RunManager()
+    run, created = await manager.submit(project_id, "hello", idempotency_key="key")
+    again, created_again = await manager.submit(project_id, "hello", idempotency_key="key")
+
+    assert created and not created_again
+    assert again.id == run.id
+    with pytest.raises(HTTPException) as error:
+        await manager.submit(project_id, "something else", idempotency_key="key")
+    assert error.value.status_code == 422
+
+
+async def test_heartbeat_requeues_stale_runs(project_id):
+    crashed, survivor = RunManager(), RunManager()
+    run, _ = await crashed.submit(project_id, "hello")
+    await crashed.claim()
+    await go_stale(run.id)
+
+    await survivor.heartbeat()
+
+    requeued = await get_run(run.id)
+    assert requeued.status == RunStatus.QUEUED
+    assert requeued.worker_id is None
+    assert (await survivor.claim()).attempts == 2
+
+
+async def test_heartbeat_fails_runs_out_of_attempts(project_id):
+    manager = RunManager(max_attempts=2)
+    run, _ = await manager.submit(project_id, "hello")
+    for _ in range(2):
+        await manager.claim()
+        await go_stale(run.id)
+        await manager.heartbeat()
+
+    failed = await get_run(run.id)
+    assert failed.status == RunStatus.FAILED
+    assert failed.attempts == 2
+    async with AsyncSessionLocal() as db:
+        payloads = (await db.execute(select(WorkflowEvent.payload).where(WorkflowEvent.run_id == run.id))).scalars().all()
+    assert len(payloads) == 1 and '"action": "error"' in payloads[0]
+
+
+async def test_lock_holder_finishes_a_run_requeued_under_it(project_id):
+    stalled, other = RunManager(), RunManager(poll_interval=0)
+    run, _ = await stalled.submit(project_id, "hello")
+    await stalled.claim()
+    async with project_locks.running(project_id) as acquired:
+        assert acquired
+        await go_stale(run.id)
+        await other.heartbeat()
+        claimed = await other.claim()
+        # The project is still locked by the stalled worker: the claim is undone, and not counted.
+        await other._process(claimed)
+        assert (await get_run(run.id)).attempts == 1
+
+        await stalled._finish(run.id, RunStatus.SUCCEEDED)
+
+    finished = await get_run(run.id)
+    assert finished.status == RunStatus.SUCCEEDED
+    assert await other.claim() is None
@@ -0,0 +1,43 @@
+import pytest
+from e2b import FileNotFoundException, SandboxNotFoundException
+from fastapi import HTTPException
+
+from benchmarks.fakes import FakeSandboxBackend
+from app.services.sandbox_cache import SandboxConnectionCache
+from app.services.sandbox_pool import E2BSandboxBackend, sandbox_pool
+from app.services.sandbox_service import SandboxConnectionError
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def sandbox_id(monkeypatch) -> str:
+    backend = FakeSandboxBackend()
+    monkeypatch.setattr(sandbox_pool, "backend", backend)
+    return (await backend.create("test")).sandbox_id
+
+
+async def test_errors_inside_the_block_keep_the_cached_handle(sandbox_id):
+    cache = SandboxConnectionCache()
+    with pytest.raises(HTTPException):
+        async with cache.lease(sandbox_id):
+            raise HTTPException(status_code=404, detail="File not found")
+
+    assert len(cache) == 1
+    assert not cache.in_use(sandbox_id)
+
+
+async def test_connection_errors_inside_the_block_drop_the_cached_handle(sandbox_id):
+    cache = SandboxConnectionCache()
+    with pytest.raises(SandboxConnectionError):
+        async with cache.lease(sandbox_id):
+            raise SandboxConnectionError("gone")
+
+    assert len(cache) == 0
+
+
+def test_e2b_connection_errors():
+    backend = E2BSandboxBackend()
+    assert backend.is_connection_error(SandboxNotFoundException("gone"))
+    assert not backend.is_connection_error(FileNotFoundException("missing.ts"))
+    assert not backend.is_connection_error(ValueError())
@@ -0,0 +1,142 @@
+import uuid
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import update
+
+from app.core.database import AsyncSessionLocal
+from app.core.utils import utcnow
+from app.models.database import RunStatus, SandboxLease
+from app.schemas.project import SandboxLeaseResponse
+from app.services.sandbox_leases import SandboxLeaseRegistry
+
+pytestmark = pytest.mark.anyio
+
+
+async def set_lease(project_id, **values) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(SandboxLease).where(SandboxLease.project_id == project_id).values(**values))
+        await db.commit()
+
+
+async def leased(registry: SandboxLeaseRegistry, project_id, owner: str = "worker-a") -> None:
+    await registry.acquire(project_id, uuid.uuid4(), owner)
+    await registry.attach_sandbox(project_id, "sbx")
+
+
+async def test_acquire_and_release_record_the_run(project_id):
+    registry = SandboxLeaseRegistry(ttl=60)
+    await leased(registry, project_id)
+
+    lease = await registry.get(project_id)
+    assert lease.owner == "worker-a"
+    assert lease.run_status == RunStatus.RUNNING
+    assert lease.sandbox_id == "sbx"
+
+    await registry.release(project_id, "worker-b", RunStatus.FAILED)
+    assert (await registry.get(project_id)).owner == "worker-a"
+    await registry.release(project_id, "worker-a", RunStatus.SUCCEEDED)
+    lease = await registry.get(project_id)
+    assert lease.owner is None
+    assert lease.run_status == RunStatus.SUCCEEDED
+
+
+async def test_public_schema_does_not_expose_the_owner(project_id):
+    registry = SandboxLeaseRegistry(ttl=60)
+    await leased(registry, project_id)
+
+    response = SandboxLeaseResponse.model_validate(await registry.get(project_id)).model_dump()
+
+    assert response["running"] is True
+    assert "owner" not in response and "lease_expires_at" not in response
+
+
+async def test_expired_leases_are_reclaimed_unless_renewed(project_id):
+    registry = SandboxLeaseRegistry(ttl=60)
+    await leased(registry, project_id)
+    await set_lease(project_id, lease_expires_at=utcnow() - timedelta(seconds=1))
+
+    await registry.renew("worker-b", [project_id])
+    assert await registry.reclaim_expired() == 1
+    lease = await registry.get(project_id)
+    assert lease.owner is None
+    assert lease.run_status == RunStatus.QUEUED
+
+    await leased(registry, project_id)
+    await set_lease(project_id, lease_expires_at=utcnow() - timedelta(seconds=1))
+    await registry.renew("worker-a", [project_id])
+    assert await registry.reclaim_expired() == 0
+
+
+async def test_release_after_reclaim_records_the_final_status(project_id):
+    registry = SandboxLeaseRegistry(ttl=60)
+    await leased(registry, project_id)
+    await set_lease(project_id, lease_expires_at=utcnow() - timedelta(seconds=1))
+    await registry.reclaim_expired()
+
+    await registry.release(project_id, "worker-a", RunStatus.SUCCEEDED)
+
+    assert (await registry.get(project_id)).run_status == RunStatus.SUCCEEDED
+
+
+async def test_only_unowned_idle_sandboxes_are_paused(project_id):
+    registry = SandboxLeaseRegistry(ttl=60)
+    await leased(registry, project_id)
+    idle_before = utcnow() + timedelta(seconds=1)
+
+    # Owned by a running worker.
+    assert not await registry.mark_paused(project_id, "sbx", idle_before)
+    await registry.release(project_id, "worker-a", RunStatus.SUCCEEDED)
+    # Used after the cutoff.
+    assert not await registry.mark_paused(project_id, "sbx", utcnow() - timedelta(minutes=1))
+    # Another sandbox than the one the sweep looked at.
+    assert not await registry.mark_paused(project_id, "other", idle_before)
+
+    assert [lease.project_id for lease in await registry.idle(idle_before)] == [project_id]
+    assert await registry.mark_paused(project_id, "sbx", idle_before)
+    assert not await registry.mark_paused(project_id, "sbx", idle_before)
+    assert await registry.idle(idle_before) == []
+
+
+async def test_only_unowned_idle_sandboxes_are_killed(project_id):
+    registry = SandboxLeaseRegistry(ttl=60)
+    await leased(registry, project_id)
+    idle_before = utcnow() + timedelta(seconds=1)
+
+    assert not await registry.mark_killed(project_id, "sbx", idle_before)
+    await registry.release(project_id, "worker-a", RunStatus.SUCCEEDED)
+    assert not await registry.mark_killed(project_id, "sbx", utcnow() - timedelta(minutes=1))
+
+    assert await registry.mark_killed(project_id, "sbx", idle_before)
+    lease = await registry.get(project_id)
+    assert lease.sandbox_id is None and lease.paused_at is None
+
+
+async def test_flush_records_activity_and_resumes_paused_sandboxes(project_id):
+    registry = SandboxLeaseRegistry(ttl=60)
+    await leased(registry, project_id)
+    await registry.release(project_id, "worker-a", RunStatus.SUCCEEDED)
+    long_ago = utcnow() - timedelta(hours=1)
+    await set_lease(project_id, last_active_at=long_ago, paused_at=long_ago)
+
+    registry.touch("sbx")
+    await registry.flush()
+
+    assert (await registry.get(project_id)).paused_at is None
+    assert await registry.idle(utcnow() - timedelta(minutes=1)) == []
+
+
+async def test_flush_keeps_activity_that_could_not_be_written(project_id, monkeypatch):
+    registry = SandboxLeaseRegistry(ttl=60)
+    registry.touch("sbx")
+
+    async def fail(stmt):
+        raise ConnectionError("database is down")
+
+    monkeypatch.setattr(registry, "_update", fail)
+    with pytest.raises(ConnectionError):
+        await registry.flush()
+    monkeypatch.undo()
+
+    registry.touch("other")
+    assert registry._touched == {"sbx", "other"}
@@ -0,0 +1,130 @@
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import update
+
+from benchmarks.fakes import FakeSandboxBackend
+from app.core.database import AsyncSessionLocal
+from app.core.utils import utcnow
+from app.models.database import RunStatus, SandboxLease
+from app.services.blob_store import blob_store
+from app.services.history_writer import HistoryRecord, history_writer
+from app.services.sandbox_cache import sandbox_cache
+from app.services.sandbox_leases import sandbox_leases
+from app.services.sandbox_lifecycle import PACKAGE_JSON, SandboxLifecycleManager
+from app.services.sandbox_pool import sandbox_pool
+from app.services.sandbox_service import INSTALL_COMMAND, SandboxService
+
+pytestmark = pytest.mark.anyio
+
+
+class RecordingBackend(FakeSandboxBackend):
+    def __init__(self) -> None:
+        super().__init__()
+        self.paused: list[str] = []
+        self.killed: list[str] = []
+
+    async def pause(self, sandbox_id: str) -> None:
+        self.paused.append(sandbox_id)
+
+    async def kill_by_id(self, sandbox_id: str) -> None:
+        self.killed.append(sandbox_id)
+        await super().kill_by_id(sandbox_id)
+
+
+@pytest.fixture
+def backend(monkeypatch) -> RecordingBackend:
+    backend = RecordingBackend()
+    monkeypatch.setattr(sandbox_pool, "backend", backend)
+    return backend
+
+
+async def save_fragment(project_id, files: dict[str, str]) -> None:
+    fragment = {"title": "App", "sandbox_url": "http://app", "files": files}
+    await history_writer.write([HistoryRecord(project_id=project_id, prompt="build", result="done", fragment=fragment)])
+
+
+async def idle_lease(project_id, sandbox_id: str, **values) -> None:
+    await sandbox_leases.acquire(project_id, project_id, "worker")
+    await sandbox_leases.attach_sandbox(project_id, sandbox_id)
+    await sandbox_leases.release(project_id, "worker", RunStatus.SUCCEEDED)
+    async with AsyncSessionLocal() as db:
+        values.setdefault("last_active_at", utcnow() - timedelta(hours=1))
+        await db.execute(update(SandboxLease).where(SandboxLease.project_id == project_id).values(**values))
+        await db.commit()
+
+
+async def test_rehydrate_restores_the_latest_fragment(project_id, backend):
+    manifest = await blob_store.put({"package.json": "{}", "src/app/page.tsx": "export default 1"})
+    await save_fragment(project_id, manifest)
+    sandbox = await backend.create("test")
+
+    restored = await SandboxLifecycleManager().rehydrate(project_id, SandboxService(sandbox))
+
+    assert PACKAGE_JSON in restored and len(restored) == 2
+    assert await sandbox.files.read("src/app/page.tsx") == "export default 1"
+
+
+async def test_rehydrate_restores_old_fragments_with_hash_like_contents(project_id, backend):
+    hash_like = "a" * 64
+    await save_fragment(project_id, {"token.txt": hash_like, "README.md": "# App"})
+    sandbox = await backend.create("test")
+
+    restored = await SandboxLifecycleManager().rehydrate(project_id, SandboxService(sandbox))
+
+    assert len(restored) == 2
+    assert await sandbox.files.read("token.txt") == hash_like
+
+
+async def test_install_dependencies_runs_with_a_timeout(project_id, backend):
+    sandbox = await backend.create("test")
+    calls = []
+    run = sandbox.commands.run
+
+    async def record(command, **kwargs):
+        calls.append((command, kwargs.get("timeout")))
+        return await run(command, **kwargs)
+
+    sandbox.commands.run = record
+    await SandboxLifecycleManager(install_timeout=42).install_dependencies(project_id, SandboxService(sandbox))
+
+    assert calls[0] == (INSTALL_COMMAND, 42)
+    # Then the dev server is restarted.
+    assert len(calls) == 3
+
+
+async def test_sweep_pauses_idle_sandboxes_and_kills_long_paused_ones(project_id, backend):
+    lifecycle = SandboxLifecycleManager(idle_timeout=600, idle_action="pause", paused_ttl=3600)
+    await idle_lease(project_id, "sbx")
+
+    await lifecycle.sweep()
+    assert backend.paused == ["sbx"]
+    assert backend.killed == []
+
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(SandboxLease).values(paused_at=utcnow() - timedelta(days=1)))
+        await db.commit()
+    await lifecycle.sweep()
+    assert backend.killed == ["sbx"]
+    assert (await sandbox_leases.get(project_id)).sandbox_id is None
+
+
+async def test_sweep_leaves_sandboxes_in_use_or_recently_used(project_id, backend):
+    lifecycle = SandboxLifecycleManager(idle_timeout=600, idle_action="kill", paused_ttl=0)
+    await idle_lease(project_id, "sbx", last_active_at=utcnow())
+    await lifecycle.sweep()
+    assert backend.killed == []
+
+    await idle_lease(project_id, "sbx")
+    sandbox = await backend.create("test")
+    sandbox.sandbox_id = "sbx"
+    sandbox_cache.put(sandbox)
+    try:
+        async with sandbox_cache.lease("sbx"):
+            await lifecycle.sweep()
+    finally:
+        sandbox_cache.invalidate("sbx")
+    assert backend.killed == []
+    # Activity was recorded instead, so the sandbox is no longer idle.
+    await sandbox_leases.flush()
+    assert await sandbox_leases.idle(utcnow() - timedelta(minutes=1)) == []
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fakes import FakeSandboxBackend
+from app.services.sandbox_pool import SandboxPool
+
+pytestmark = pytest.mark.anyio
+
+
+class BootingBackend(FakeSandboxBackend):
+    """Sandboxes whose dev server is up only once they are in ``ready``."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.ready: set[str] = set()
+
+    async def is_healthy(self, sandbox) -> bool:
+        return await super().is_healthy(sandbox) and sandbox.sandbox_id in self.ready
+
+
+def make_pool(backend, **kwargs) -> SandboxPool:
+    options = {"min_size": 2, "max_size": 2, "max_age": 900, "health_check_interval": 30, "boot_timeout": 5}
+    return SandboxPool(backend, template="test", **{**options, **kwargs})
+
+
+async def test_lease_takes_a_pooled_sandbox_and_creates_one_when_empty():
+    backend = FakeSandboxBackend()
+    pool = make_pool(backend, min_size=1, max_size=1)
+    await pool._replenish()
+    pooled = pool._idle[0].sandbox
+
+    assert await pool.lease() is pooled
+    created = await pool.lease()
+    assert created is not pooled
+    assert created.sandbox_id in backend.sandboxes
+
+
+async def test_replenish_refills_to_the_target_size():
+    pool = make_pool(FakeSandboxBackend())
+    await pool._replenish()
+    assert pool.size == 2
+
+    await pool.lease()
+    await pool._replenish()
+    # The lease raises the target above min_size, up to max_size.
+    assert pool.size == 2
+
+
+async def test_sandboxes_join_the_pool_once_the_dev_server_answers():
+    backend = BootingBackend()
+    pool = make_pool(backend, min_size=1, max_size=1)
+    replenish = asyncio.create_task(pool._replenish())
+    await asyncio.sleep(0.1)
+    assert pool.size == 0
+
+    backend.ready.update(backend.sandboxes)
+    await replenish
+    assert pool.size == 1
+
+
+async def test_sandboxes_that_never_boot_are_killed():
+    backend = BootingBackend()
+    pool = make_pool(backend, min_size=1, max_size=1, boot_timeout=0)
+    await pool._replenish()
+    await asyncio.gather(*pool._background)
+
+    assert pool.size == 0
+    assert not backend.sandboxes
+
+
+async def test_health_check_evicts_unhealthy_sandboxes():
+    backend = FakeSandboxBackend()
+    pool = make_pool(backend)
+    await pool._replenish()
+    broken, healthy = (pooled.sandbox for pooled in pool._idle)
+    backend.sandboxes.pop(broken.sandbox_id)
+
+    await pool._check_health()
+
+    assert [pooled.sandbox for pooled in pool._idle] == [healthy]
+
+
+async def test_stop_kills_idle_sandboxes():
+    backend = FakeSandboxBackend()
+    pool = make_pool(backend)
+    await pool.start()
+    for _ in range(100):
+        if pool.size == 2:
+            break
+        await asyncio.sleep(0.01)
+
+    await pool.stop()
+
+    assert pool.size == 0
+    assert not backend.sandboxes
@@ -0,0 +1,33 @@
+import pytest
+
+from app.core import session
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_close_session_service_disposes_the_shared_service():
+    service = session.get_session_service()
+    assert session.get_session_service() is service
+    pool = service.db_engine.sync_engine.pool
+
+    await session.close_session_service()
+    # Disposing an engine replaces its pool with a fresh one.
+    assert service.db_engine.sync_engine.pool is not pool
+    assert session._session_service is None
+
+    replacement = session.get_session_service()
+    assert replacement is not service
+    await session.close_session_service()
+
+
+async def test_runner_follows_a_replaced_session_service():
+    from app.services.workflow_service import get_runner
+
+    runner = get_runner()
+    assert get_runner() is runner
+
+    await session.close_session_service()
+    replacement = get_runner()
+    assert replacement is not runner
+    assert replacement.session_service is session.get_session_service()
+    await session.close_session_service()
@@ -0,0 +1,63 @@
+"""Agent worker: executes queued runs without serving HTTP.
+
+API processes started with RUN_WORKERS_ENABLED=false only queue runs and
+never import the agent stack (google-adk, google-genai, e2b), so they start
+quickly; run this next to them to execute the runs:
+
+    python worker.py
+"""
+import asyncio
+import logging
+import signal
+
+from app.core.session import close_session_service, init_session_service
+from app.services.event_log import event_log_store
+from app.services.history_writer import history_writer
+from app.services.run_manager import run_manager
+from app.services.sandbox_cache import sandbox_cache
+from app.services.sandbox_leases import sandbox_leases
+from app.services.sandbox_lifecycle import sandbox_lifecycle
+from app.services.sandbox_pool import sandbox_pool
+
+
+async def start() -> None:
+    """Load the agent stack and start executing queued runs in this process."""
+    from app.services.workflow_service import get_runner
+
+    init_session_service()
+    get_runner()
+    await sandbox_pool.start()
+    await history_writer.start()
+    await run_manager.start()
+
+
+async def stop() -> None:
+    await run_manager.stop()
+    await history_writer.stop()
+    await sandbox_pool.stop()
+    await close_session_service()
+
+
+async def main() -> None:
+    await sandbox_cache.start()
+    await sandbox_leases.start()
+    await sandbox_lifecycle.start()
+    await event_log_store.start()
+    await start()
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+    try:
+        await stopping.wait()
+    finally:
+        await stop()
+        await event_log_store.stop()
+        await sandbox_lifecycle.stop()
+        await sandbox_leases.stop()
+        await sandbox_cache.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(main())